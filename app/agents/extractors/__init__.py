@@ -2,54 +2,66 @@
 Extractor orchestrator.
 
 run_all() routes to the correct extractor(s) based on the routing result and
-runs them in parallel using asyncio.gather().
+runs them in parallel in an asyncio.TaskGroup.
 
 Each extractor returns a list of section dicts:
   [{"sectionTitle": "...", "data": {...}}, ...]
 
 All section lists are flattened into a single ordered list.
 
-Currency handling: a live exchange rate is fetched ONCE here (before the gather)
-and injected into every extractor call. This keeps rate-fetching in one place.
+Currency handling: a live exchange rate is fetched ONCE here and injected into
+every extractor call. This keeps rate-fetching in one place. The fetch runs as a
+task alongside the extractors — each extractor awaits it just before building its
+Claude call (the note is part of the prompt).
+
+Service fee: built last, from the extracted sections' pax count and trip dates.
+Its Claude fallback only runs for invoices whose sections lack those (see
+service_fee.py).
+
+Batch mode (run_all_batch()): instead of one real-time Claude call per extractor,
+every extractor request of every invoice is collected via its build_request() and
+submitted as a single Message Batch (50% token cost, minutes instead of seconds).
+Only for non-interactive runs — the upload form keeps the real-time path.
 """
 
 import asyncio
+import importlib
+import time
+from collections.abc import Callable
 from datetime import date
+from functools import partial
+from itertools import chain
 
-from app.agents.extractors import (
-    flight as flight_ext,
-    tour as tour_ext,
-    day_tour as day_tour_ext,
-    hotel as hotel_ext,
-    cruise as cruise_ext,
-    insurance as insurance_ext,
-    service_fee as sf_ext,
-    new_traveller as nt_ext,
-    rail as rail_ext,
-    seat_selection as seat_selection_ext,
-    vacation_package as vacation_package_ext,
-)
+from app.agents.extractors.base import call_claude_batch
 from app.agents.extractors.currency import build_rate_note
 
-# Maps booking type strings (from routing agent) to extractor functions
+# Maps booking type strings (from routing agent) to extractor module paths.
+# Every module exposes run() (real-time call) and build_request() (batch mode).
+# Modules are imported on first use (importlib.import_module, cached in sys.modules)
+# — most invoices route to one or two booking types, so the other extractors'
+# prompt templates are never built.
 EXTRACTOR_MAP = {
-    "flight": flight_ext.run,
-    "tour": tour_ext.run,
-    "day_tour": day_tour_ext.run,
-    "hotel": hotel_ext.run,
-    "cruise": cruise_ext.run,
-    "insurance": insurance_ext.run,
-    "new_traveller": nt_ext.run,
-    "rail": rail_ext.run,
-    "seat_selection": seat_selection_ext.run,
-    "vacation_package": vacation_package_ext.run,
+    "flight": "app.agents.extractors.flight",
+    "tour": "app.agents.extractors.tour",
+    "day_tour": "app.agents.extractors.day_tour",
+    "hotel": "app.agents.extractors.hotel",
+    "cruise": "app.agents.extractors.cruise",
+    "insurance": "app.agents.extractors.insurance",
+    "new_traveller": "app.agents.extractors.new_traveller",
+    "rail": "app.agents.extractors.rail",
+    "seat_selection": "app.agents.extractors.seat_selection",
+    "vacation_package": "app.agents.extractors.vacation_package",
 }
 
 
 _NARRATIVE_BOOKING_TYPES = {"tour", "cruise"}
 
 
-async def run_all(payload: dict, routing: dict, service_fee_amount: float) -> list[dict]:
+async def run_all(
+    payload: dict,
+    routing: dict,
+    service_fee_amount: float,
+) -> list[dict]:
     """Run all required extractors in parallel; return flat ordered list of sections.
 
     Args:
@@ -63,31 +75,83 @@ async def run_all(payload: dict, routing: dict, service_fee_amount: float) -> li
     Returns:
         Flat list of section dicts sorted by booking type order, then service fee last.
     """
+    tasks, rate_task, _, service_fee = await _plan_tasks(
+        payload, routing, service_fee_amount, batch=False
+    )
+    return await _collect(tasks, rate_task, service_fee)
+
+
+async def run_all_batch(invoices: list[tuple[dict, dict, float]]) -> list[list[dict]]:
+    """Extract several invoices at once with a single Message Batch.
+
+    For bulk / overnight runs (e.g. a backlog folder of invoices): every extractor
+    call for every invoice goes into ONE batch at 50% token cost, instead of one
+    batch per invoice. Service fees are built from each invoice's extracted sections.
+
+    Args:
+        invoices: (payload, routing, service_fee_amount) per invoice — the same
+                  arguments run_all() takes.
+
+    Returns:
+        One flat section list per invoice, in the same order as invoices.
+    """
+    plans = [
+        await _plan_tasks(payload, routing, service_fee_amount, batch=True)
+        for payload, routing, service_fee_amount in invoices
+    ]
+    _submit_batch([(tasks, batch_requests) for tasks, _, batch_requests, _ in plans])
+    return list(
+        await asyncio.gather(
+            *(_collect(tasks, rate_task, service_fee) for tasks, rate_task, _, service_fee in plans)
+        )
+    )
+
+
+async def _plan_tasks(
+    payload: dict,
+    routing: dict,
+    service_fee_amount: float,
+    batch: bool,
+) -> tuple[list, asyncio.Future, list[tuple[int, dict]], Callable | None]:
+    """Build one coroutine per extractor for run_all / run_all_batch.
+
+    Returns the coroutines in output order, the shared exchange-rate task (which
+    the caller cancels once the coroutines have finished), and — in batch mode —
+    the (slot, build_request() dict) pairs whose None slots _submit_batch() fills,
+    and the service fee builder (None if there is no fee) for _service_fee_sections().
+    """
     markdown = payload.get("extract", "") if isinstance(payload, dict) else payload
     source_blocks = payload.get("source_blocks", []) if isinstance(payload, dict) else []
 
     # Fetch live exchange rate once — shared by all extractors in this run.
-    # Returns None if invoice is in CAD (no conversion needed).
-    exchange_rate_note = await build_rate_note(markdown)
+    # Resolves to None if invoice is in CAD (no conversion needed).
+    rate_task = asyncio.ensure_future(build_rate_note(markdown))
 
     # Today's date injected as a fallback for missing booking/reservation dates.
+    # Read once per invoice so every extractor and the service fee agree on it,
+    # even when the run straddles midnight.
     today_date = date.today().strftime("%m/%d/%y")
 
     tasks = []
+    batch_requests = []  # (slot in tasks, request) — batch mode only
 
-    for booking_type in routing.get("bookingTypes", []):
-        extractor_fn = EXTRACTOR_MAP.get(booking_type)
-        if extractor_fn:
+    # One extractor call per distinct booking type — a repeated type (e.g. two
+    # flight segments reported as ["flight", "flight"]) would otherwise re-send the
+    # whole invoice and produce duplicate sections. Routing order is preserved.
+    for booking_type in dict.fromkeys(routing.get("bookingTypes", [])):
+        module_path = EXTRACTOR_MAP.get(booking_type)
+        if module_path:
+            extractor = importlib.import_module(module_path)
+            kwargs = {}
             if booking_type in _NARRATIVE_BOOKING_TYPES and source_blocks:
-                tasks.append(
-                    extractor_fn(
-                        markdown, routing, exchange_rate_note, today_date,
-                        source_blocks=source_blocks,
-                    )
-                )
+                kwargs["source_blocks"] = source_blocks
+            if batch:
+                args = (markdown, routing, await rate_task, today_date)
+                batch_requests.append((len(tasks), extractor.build_request(*args, **kwargs)))
+                tasks.append(None)  # filled in once the batch is submitted
             else:
                 tasks.append(
-                    extractor_fn(markdown, routing, exchange_rate_note, today_date)
+                    _run_with_rate(extractor, rate_task, markdown, routing, today_date, **kwargs)
                 )
         else:
             # Unknown booking type — skip with a warning section
@@ -95,27 +159,121 @@ async def run_all(payload: dict, routing: dict, service_fee_amount: float) -> li
                 _unknown_type_section(booking_type)
             )
 
-    # Service fee always appended last if amount > 0
+    # Service fee always appended last if amount > 0. It runs after the extractors,
+    # reusing their pax count and trip dates.
+    service_fee = None
     if service_fee_amount > 0:
-        tasks.append(sf_ext.run(markdown, routing, service_fee_amount))
-
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    sections = []
-    for result in results:
-        if isinstance(result, Exception):
-            sections.append(
-                {
-                    "sectionTitle": "Extraction Error",
-                    "data": {"error": str(result)},
-                }
-            )
-        else:
-            sections.extend(result)
+        sf_ext = importlib.import_module("app.agents.extractors.service_fee")
+        service_fee = partial(
+            sf_ext.run, markdown, routing, service_fee_amount, today_date=today_date
+        )
+
+    return tasks, rate_task, batch_requests, service_fee
+
 
+def _submit_batch(plans: list[tuple[list, list]]) -> None:
+    """Submit every planned batch request as ONE Message Batch and fill in the slots.
+
+    plans holds (tasks, batch_requests) pairs from _plan_tasks(); each None slot in
+    tasks is replaced by a coroutine that waits for the shared batch and returns
+    that request's result. No-op when nothing was planned for batch mode.
+    """
+    requests = [request for _, batch_requests in plans for _, request in batch_requests]
+    if not requests:
+        return
+
+    batch_future = asyncio.ensure_future(call_claude_batch(requests))
+    index = 0
+    for tasks, batch_requests in plans:
+        for slot, _ in batch_requests:
+            tasks[slot] = _batch_result(batch_future, index)
+            index += 1
+
+
+async def _collect(
+    tasks: list,
+    rate_task: asyncio.Future,
+    service_fee: Callable | None = None,
+) -> list[dict]:
+    """Run one invoice's planned tasks and flatten them into its ordered section list."""
+    # Each task captures its own exception, so one failing extractor never cancels
+    # its siblings in the TaskGroup (same semantics as gather(return_exceptions=True)).
+    async with asyncio.TaskGroup() as tg:
+        running = [tg.create_task(_capture(task)) for task in tasks]
+    results = [task.result() for task in running]
+    rate_task.cancel()  # no-op once done; stops the fetch if no extractor needed it
+
+    sections = _flatten(results)
+    return sections + await _service_fee_sections(service_fee, sections)
+
+
+def _flatten(results: list) -> list[dict]:
+    """Flatten per-extractor results (section lists or exceptions) into one list."""
+    # Errors stay in the slot of the extractor that raised them, so the email keeps
+    # booking-type order even when one extractor fails.
+    return list(
+        chain.from_iterable(
+            _error_section(result) if isinstance(result, Exception) else result
+            for result in results
+        )
+    )
+
+
+async def _service_fee_sections(service_fee: Callable | None, sections: list[dict]) -> list[dict]:
+    """Run the planned service fee builder on the extracted sections ([] if no fee)."""
+    if service_fee is None:
+        return []
+    result = await _capture(service_fee(sections=sections))
+    return _error_section(result) if isinstance(result, Exception) else result
+
+
+async def _capture(coro) -> list[dict] | Exception:
+    """Await one extractor coroutine, returning its exception instead of raising."""
+    try:
+        return await coro
+    except Exception as exc:
+        return exc
+
+
+def _error_section(exc: Exception) -> list[dict]:
+    """Section reported in place of an extractor that raised."""
+    return [
+        {
+            "sectionTitle": "Extraction Error",
+            "data": {"error": str(exc)},
+        }
+    ]
+
+
+async def _run_with_rate(
+    extractor,
+    rate_task: asyncio.Future,
+    markdown: str,
+    routing: dict,
+    today_date: str,
+    **kwargs,
+) -> list[dict]:
+    """Wait for the shared exchange-rate fetch, then run one extractor.
+
+    Logs each extractor as it completes (completion order, not booking-type order),
+    so a slow invoice shows in the logs which extractor is still outstanding.
+    """
+    exchange_rate_note = await rate_task
+    started = time.perf_counter()
+    sections = await extractor.run(markdown, routing, exchange_rate_note, today_date, **kwargs)
+    print(f"[run_all] {extractor.__name__.rsplit('.', 1)[-1]}: {len(sections)} section(s) "
+          f"in {time.perf_counter() - started:.1f}s")
     return sections
 
 
+async def _batch_result(batch_future: asyncio.Future, index: int) -> list[dict]:
+    """Await the shared Message Batch and return (or raise) one extractor's result."""
+    result = (await batch_future)[index]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
 async def _unknown_type_section(booking_type: str) -> list[dict]:
     """Placeholder section for unrecognised booking types."""
     return [
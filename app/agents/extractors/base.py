@@ -1,40 +1,112 @@
 """
 Shared utilities for all extractor agents.
 
-  GLOBAL_RULES   — formatting rules injected into every extractor prompt
-  call_claude()  — makes a Claude API call and parses the JSON array response
+  GLOBAL_RULES           — formatting rules injected into every extractor prompt
+  PROFILE_GLOBAL_RULES   — the subset for profile extraction (no currency / invoiceRemarks)
+  AGENT_REMARKS_TEMPLATE — the non-CAD agentRemarks block (shared with vendor rules)
+  extractor_model()      — Sonnet, or Haiku for booking types opted in via HAIKU_EXTRACTORS
+  anthropic_client()     — the shared Anthropic client (one per event loop)
+  api_slots()            — semaphore capping in-flight Claude requests (ANTHROPIC_CONCURRENCY)
+  cached_system()        — wraps a static system prompt as a prompt-cached text block
+  call_claude()          — makes a Claude API call and parses the JSON array response
+  call_claude_batch()    — submits several extractor requests as one Message Batch
+                           (50% token cost, asynchronous) and parses every response
+  trim_markdown()        — cuts a multi-booking invoice down to the lines relevant to one
+                           extractor (keyword windows + the document header)
+  invoice_user_content() — the standard VENDOR / RULE SET / invoice / rate-note user
+                           message shared by the rule-set extractors
 """
 
 import asyncio
-import json
+import copy
+import hashlib
+import os
 import re
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Callable
+from functools import lru_cache
+
 import anthropic
+import httpx
+import orjson
+
+# Extractors run on Sonnet. Structurally simple ones (insurance, new_traveller) can be
+# moved to Haiku per booking type with HAIKU_EXTRACTORS=insurance,new_traveller — off
+# by default until a Sonnet vs Haiku comparison on real invoices is recorded.
+SONNET_MODEL = "claude-sonnet-4-6"
+HAIKU_MODEL = "claude-haiku-4-5-20251001"
+_HAIKU_EXTRACTORS = frozenset(
+    name.strip() for name in os.environ.get("HAIKU_EXTRACTORS", "").split(",") if name.strip()
+)
+
+# One Anthropic client per event loop (see anthropic_client()), shared by every agent
+# and extractor call so run_all()'s parallel requests reuse pooled keep-alive
+# connections instead of each paying for a fresh TCP + TLS handshake.
+# max_retries=6 gives ~60s total backoff — handles Tier 1 rate limits automatically.
+_CLIENT: anthropic.AsyncAnthropic | None = None
+
+# Caps in-flight Claude requests (every agent, extractor and the service fee fallback),
+# so concurrent invoices queue here instead of fanning out into 429s. Per event loop,
+# like _CLIENT. The app-level retry loops release their slot before each backoff sleep,
+# but the SDK's own retries (max_retries above: 429s, 5xx, dropped connections) back
+# off inside the request and so keep holding it — a 429 storm can idle every slot for
+# up to that ~60s. Kept because the batch and token-count calls rely on SDK retries.
+_API_CONCURRENCY = int(os.environ.get("ANTHROPIC_CONCURRENCY", "5"))
+_API_SLOTS: asyncio.Semaphore | None = None
+_CLIENT_LOOP: asyncio.AbstractEventLoop | None = None
 
-GLOBAL_RULES = """\
+# Parsed results of recent call_claude() requests, keyed by a hash of the full request.
+# A re-upload of the same invoice (or a pipeline retry) on a warm container returns
+# the earlier extraction instead of paying for the same Claude call again. LRU-bounded.
+_RESULT_CACHE: OrderedDict[str, list[dict]] = OrderedDict()
+_RESULT_CACHE_SIZE = 256
+
+# Optional second cache layer shared by every container: set INVOICE_RESULT_CACHE_DICT
+# to a modal.Dict name. A retried or re-uploaded invoice usually lands on a fresh
+# container (cold local cache); with this set it still skips the Claude call — and
+# Anthropic's rate limiter. Off by default, since a re-upload then never re-extracts.
+_SHARED_CACHE_NAME = os.environ.get("INVOICE_RESULT_CACHE_DICT", "")
+
+# The 4-line agentRemarks block for non-CAD invoices. Shared by GLOBAL_RULES and the
+# vendor rules that restate it, so every prompt carries byte-identical wording.
+AGENT_REMARKS_TEMPLATE = """\
+    DEPOSIT PAID: $[CAD amount] CAD
+    COMMISSION: [raw amount] [currency]
+    Invoiced in [currency] by Supplier
+    Amounts in CB Converted to CAD on [MM/DD/YY] @ rate of 1 [currency] : [rate] CAD\
+"""
+
+# GLOBAL_RULES is assembled from blocks so profile extraction (no money, no booking)
+# can reuse the formatting rules without the currency and invoiceRemarks blocks.
+_FIELD_FORMAT_RULES = """\
 GLOBAL FORMATTING RULES (apply to every field without exception):
 - Dates: MUST be MM/DD/YY (e.g., "08/26/24"). Convert from any other format.
 - Times: MUST be 12-hour with AM/PM (e.g., "4:40 PM"). Convert from 24-hour if needed.
 - Missing fields: Use "" (empty string) for any field where no value is available.
   NEVER omit a key. NEVER use null, undefined, "N/A", "?", "??", or any other placeholder.
   If you are uncertain about a value, use "" — never use a question mark.
+"""
+
+_CURRENCY_RULES = """\
 - Currency amounts: If the invoice is in CAD, extract figures exactly as shown.
   If the invoice is NOT in CAD, a LIVE EXCHANGE RATE line will be provided in the input
   (e.g. "LIVE EXCHANGE RATE: 1 EUR = 1.4823 CAD (fetched 02/19/26)").
   Use that exact rate to convert totalBase to CAD.
   Do NOT convert commission — always record commission in the original invoice currency.
   Populate the agentRemarks field as follows:
-    DEPOSIT PAID: $[CAD amount] CAD
-    COMMISSION: [raw amount] [currency]
-    Invoiced in [currency] by Supplier
-    Amounts in CB Converted to CAD on [MM/DD/YY] @ rate of 1 [currency] : [rate] CAD
+""" + AGENT_REMARKS_TEMPLATE + """
   This applies to ALL booking types (flight, tour, hotel, cruise, etc.).
-- Accented characters: Replace with their unaccented ASCII equivalent in ALL string fields.
-  Examples: é→e, è→e, ê→e, ë→e, à→a, â→a, ô→o, î→i, û→u, ç→c, ü→u, ñ→n, etc.
-  Example: "Hôtel de Varenne" → "Hotel de Varenne"
+"""
+
+_ARROW_RULES = """\
 - Arrow characters: ClientBase Online renders Unicode arrows (→, ➔, ➞, ⟶, ➜, ➝, etc.)
   as question marks. Replace any arrow character with "->" (hyphen + greater-than) in
   ALL string fields — route indicators, seat selections, itinerary notes, everywhere.
   Example: "YEG → YYZ" → "YEG -> YYZ"
+"""
+
+_BOOKING_RULES = """\
 - Booking/reservation date: If no booking or reservation date appears on the invoice,
   use the TODAY'S DATE value provided in the input. Format it as MM/DD/YY.
 - Client-facing remarks — currency disclosure + financial summary (ALL booking types, ALL currencies including CAD):
@@ -67,14 +139,57 @@ GLOBAL FORMATTING RULES (apply to every field without exception):
     · "Insight Vacations" → "Insight Vacations (Canada) Ltd"
     · "Beds Online" / "BedsOnline" / "Beds On Line" → "BedsonLine"
     · "Intrepid" → "Intrepid Travel"
+"""
+
+_OUTPUT_RULE = """\
 - Output: Return ONLY the JSON array described in the schema. No prose, no code fences.\
 """
 
 
+GLOBAL_RULES = (
+    _FIELD_FORMAT_RULES + _CURRENCY_RULES + _ARROW_RULES + _BOOKING_RULES + _OUTPUT_RULE
+)
+
+# For extractors that handle no money and no booking (new traveller profiles).
+PROFILE_GLOBAL_RULES = _FIELD_FORMAT_RULES + _ARROW_RULES + _OUTPUT_RULE
+
+
+def extractor_model(booking_type: str) -> str:
+    """Model for an extractor: Haiku if HAIKU_EXTRACTORS opts its booking type in, else Sonnet."""
+    return HAIKU_MODEL if booking_type in _HAIKU_EXTRACTORS else SONNET_MODEL
+
+
+def _bind_loop() -> None:
+    """Create the client and request semaphore for the running event loop if needed.
+
+    Both are bound to the loop they are first used on, so a new loop (e.g. a fresh
+    asyncio.run()) gets its own rather than a dead connection pool.
+    """
+    global _CLIENT, _API_SLOTS, _CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if _CLIENT_LOOP is not loop:
+        _CLIENT = anthropic.AsyncAnthropic(max_retries=6)
+        _API_SLOTS = asyncio.Semaphore(_API_CONCURRENCY)
+        _CLIENT_LOOP = loop
+
+
+def anthropic_client() -> anthropic.AsyncAnthropic:
+    """The shared Anthropic client for the running event loop."""
+    _bind_loop()
+    return _CLIENT
+
+
+def api_slots() -> asyncio.Semaphore:
+    """The semaphore every Claude request holds while in flight (ANTHROPIC_CONCURRENCY)."""
+    _bind_loop()
+    return _API_SLOTS
+
+
 async def call_claude(
     system_prompt: str,
     user_content: str | list[dict],
     max_tokens: int = 4096,
+    model: str = SONNET_MODEL,
 ) -> list[dict]:
     """Make a Claude API call and parse the JSON array response.
 
@@ -85,50 +200,392 @@ async def call_claude(
                        tour/cruise extractors need to read the raw document, they
                        pass source_blocks + an instruction block as a list.
         max_tokens:    Token budget for the response.
+        model:         Claude model ID (Sonnet unless the extractor opts into Haiku).
 
     Returns:
         Parsed list of section dicts, each with 'sectionTitle' and 'data'.
 
     Raises:
-        json.JSONDecodeError: If Claude returns malformed JSON.
-        ValueError: If Claude returns something other than a JSON array.
+        orjson.JSONDecodeError: If Claude returns malformed JSON
+            (a json.JSONDecodeError subclass).
+        ValueError: If Claude returns something other than a JSON array of
+            {'sectionTitle', 'data'} sections.
     """
-    # max_retries=6 gives ~60s total backoff — handles Tier 1 rate limits automatically
-    client = anthropic.AsyncAnthropic(max_retries=6)
+    key = _request_key(system_prompt, user_content, max_tokens, model)
+    cached = await _cache_get(key)
+    if cached is not None:
+        return cached
 
     # Application-level retries for transient failures (overload, connection, timeout).
     # Exponential backoff: 30s → 60s → 120s → 240s (capped at 300s).
     app_retries = 8
     for attempt in range(app_retries + 1):
         try:
-            message = await client.messages.create(
-                model="claude-sonnet-4-6",
-                max_tokens=max_tokens,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_content}],
-            )
+            # Streamed so tokens are received as they're generated and long 8k-token
+            # extractions never sit on one idle HTTP read; the final message is the
+            # same object messages.create() would have returned.
+            async with api_slots():
+                async with anthropic_client().messages.stream(
+                    model=model,
+                    max_tokens=max_tokens,
+                    system=cached_system(system_prompt),
+                    messages=[{"role": "user", "content": user_content}],
+                ) as stream:
+                    message = await stream.get_final_message()
             break  # success
-        except (anthropic.APIConnectionError, anthropic.APITimeoutError) as e:
-            if attempt < app_retries:
+        except (anthropic.APIError, httpx.TransportError) as e:
+            if _is_transient(e) and attempt < app_retries:
                 delay = min(30 * (2 ** attempt), 300)
-                print(f"[call_claude] {type(e).__name__}, retrying in {delay}s "
-                      f"(attempt {attempt + 1}/{app_retries})")
-                await asyncio.sleep(delay)
-                continue
-            raise
-        except anthropic.APIStatusError as e:
-            if e.status_code == 529 and attempt < app_retries:
-                delay = min(30 * (2 ** attempt), 300)
-                print(f"[call_claude] Anthropic overloaded (529), retrying in {delay}s "
+                print(f"[call_claude] {type(e).__name__} ({e}), retrying in {delay}s "
                       f"(attempt {attempt + 1}/{app_retries})")
                 await asyncio.sleep(delay)
                 continue
             raise
 
+    # Prompt-cache check: cache_read > 0 means the system prompt was served from cache.
+    usage = message.usage
+    print(f"[call_claude] tokens: input={usage.input_tokens} "
+          f"cache_read={usage.cache_read_input_tokens or 0} "
+          f"cache_write={usage.cache_creation_input_tokens or 0} "
+          f"output={usage.output_tokens}")
+
+    sections = _parse_sections(message)
+    await _cache_put(key, sections)
+    return sections
+
+
+# Error types in an API error body worth retrying. Mid-stream, an overload arrives as
+# an SSE error event that the SDK raises as APIStatusError with the already-open
+# response's 200 status — only the body says what went wrong.
+_TRANSIENT_ERROR_TYPES = frozenset({"overloaded_error", "api_error"})
+
+
+def _is_transient(exc: Exception) -> bool:
+    """True if a failed Claude request is worth retrying after a backoff.
+
+    Covers connection errors and timeouts (including an httpx transport error
+    raised while a stream is being read), 529 overloads, and overloaded / api
+    errors reported inside the response body.
+    """
+    if isinstance(exc, (anthropic.APIConnectionError, httpx.TransportError)):
+        return True
+    if not isinstance(exc, anthropic.APIStatusError):
+        return False
+    if exc.status_code == 529:
+        return True
+    error = exc.body.get("error") if isinstance(exc.body, dict) else None
+    return isinstance(error, dict) and error.get("type") in _TRANSIENT_ERROR_TYPES
+
+
+def _request_key(
+    system_prompt: str,
+    user_content: str | list[dict],
+    max_tokens: int,
+    model: str,
+) -> str:
+    """Content hash of a call_claude() request, used as the _RESULT_CACHE key."""
+    content = user_content if isinstance(user_content, str) else orjson.dumps(
+        user_content, option=orjson.OPT_SORT_KEYS
+    ).decode()
+    h = hashlib.blake2b(digest_size=16)
+    for part in (model, system_prompt, content, str(max_tokens)):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+async def _cache_get(key: str) -> list[dict] | None:
+    """Look up a parsed result: in-process LRU first, then the shared modal.Dict."""
+    cached = _RESULT_CACHE.get(key)
+    if cached is not None:
+        _RESULT_CACHE.move_to_end(key)
+        print("[call_claude] result cache hit")
+        return copy.deepcopy(cached)
+
+    if _SHARED_CACHE_NAME:
+        try:
+            cached = await _shared_cache().get.aio(key)
+        except Exception as exc:
+            print(f"[call_claude] shared cache get failed: {type(exc).__name__}: {exc}")
+            return None
+        if cached is not None:
+            print("[call_claude] shared result cache hit")
+            _RESULT_CACHE[key] = copy.deepcopy(cached)
+            return cached
+    return None
+
+
+async def _cache_put(key: str, sections: list[dict]) -> None:
+    """Store a parsed result in the in-process LRU (and the shared modal.Dict if set)."""
+    _RESULT_CACHE[key] = copy.deepcopy(sections)
+    if len(_RESULT_CACHE) > _RESULT_CACHE_SIZE:
+        _RESULT_CACHE.popitem(last=False)
+
+    if _SHARED_CACHE_NAME:
+        try:
+            await _shared_cache().put.aio(key, sections)
+        except Exception as exc:
+            # A cache write failure must never fail the extraction itself.
+            print(f"[call_claude] shared cache put failed: {type(exc).__name__}: {exc}")
+
+
+@lru_cache(maxsize=1)
+def _shared_cache():
+    """The modal.Dict named by INVOICE_RESULT_CACHE_DICT (created on first use)."""
+    import modal
+
+    return modal.Dict.from_name(_SHARED_CACHE_NAME, create_if_missing=True)
+
+
+def cached_system(system_prompt: str) -> list[dict]:
+    """Wrap a system prompt as a single text block marked for prompt caching.
+
+    Extractor system prompts (vendor rules + GLOBAL_RULES + schema) are fully static —
+    everything invoice-specific lives in user_content — so the whole block is cached
+    and repeat calls within the cache TTL are billed at the cache-read rate.
+    """
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+# Message Batches are processed asynchronously (usually minutes, up to 24h) —
+# poll the batch status at this interval until processing has ended.
+_BATCH_POLL_SECONDS = 30
+
+
+async def call_claude_batch(
+    requests: list[dict],
+    parse: Callable | None = None,
+) -> list[list[dict] | Exception]:
+    """Submit several extractor requests as a single Message Batch and wait for them.
+
+    Batched requests are billed at 50% of the real-time price but may take
+    minutes to complete, so this is only for non-interactive runs — the
+    interactive upload path keeps using call_claude().
+
+    Args:
+        requests: List of call_claude() keyword dicts, as returned by each
+                  extractor's build_request():
+                  {"system_prompt": str, "user_content": str | list[dict], "max_tokens": int,
+                   "model": str (optional, defaults to Sonnet)}
+        parse:    Turns each succeeded response message into its result. Defaults to
+                  the section-list parser; Agents 1 and 2 pass their own.
+
+    Returns:
+        One entry per request, in the same order: the parsed result (a list of
+        section dicts by default), or the Exception raised for that request
+        (errored / expired / unparseable).
+    """
+    parse = parse or _parse_sections
+    batch = await anthropic_client().messages.batches.create(
+        requests=[
+            {
+                "custom_id": f"request-{i}",
+                "params": {
+                    "model": req.get("model", SONNET_MODEL),
+                    "max_tokens": req.get("max_tokens", 4096),
+                    "system": cached_system(req["system_prompt"]),
+                    "messages": [{"role": "user", "content": req["user_content"]}],
+                },
+            }
+            for i, req in enumerate(requests)
+        ]
+    )
+    print(f"[call_claude_batch] submitted batch {batch.id} ({len(requests)} requests)")
+
+    try:
+        while batch.processing_status != "ended":
+            await asyncio.sleep(_BATCH_POLL_SECONDS)
+            batch = await anthropic_client().messages.batches.retrieve(batch.id)
+    except asyncio.CancelledError:
+        # The caller gave up (e.g. run_pipeline_batch's deadline) — stop the batch so
+        # requests nobody will read aren't billed.
+        try:
+            await anthropic_client().messages.batches.cancel(batch.id)
+            print(f"[call_claude_batch] cancelled batch {batch.id}")
+        except Exception as exc:
+            print(f"[call_claude_batch] could not cancel batch {batch.id}: {exc}")
+        raise
+
+    # Results stream back in arbitrary order — match them up by custom_id.
+    by_id = {}
+    async for entry in await anthropic_client().messages.batches.results(batch.id):
+        by_id[entry.custom_id] = entry.result
+
+    results: list[list[dict] | Exception] = []
+    for i in range(len(requests)):
+        result = by_id.get(f"request-{i}")
+        if result is None:
+            results.append(RuntimeError(f"Batch {batch.id} returned no result for request-{i}"))
+        elif result.type != "succeeded":
+            results.append(RuntimeError(f"Batch {batch.id} request-{i} {_batch_failure(result)}"))
+        else:
+            try:
+                results.append(parse(result.message))
+            except Exception as exc:
+                results.append(exc)
+
+    return results
+
+
+def _batch_failure(result) -> str:
+    """Describe a non-succeeded batch result: "errored (type: message)", "expired", ..."""
+    # Only errored results carry an error; expired / canceled ones just have a type.
+    error = getattr(getattr(result, "error", None), "error", None)
+    if error is None:
+        return result.type
+    return f"{result.type} ({error.type}: {error.message})"
+
+
+def trim_markdown(
+    markdown: str,
+    pattern: re.Pattern,
+    context_lines: int = 30,
+    header_lines: int = 20,
+) -> str:
+    """Keep only the parts of an invoice that mention one booking type.
+
+    Keeps the first header_lines lines (traveller, booking reference, vendor) plus
+    context_lines either side of every line matching pattern; dropped runs are
+    replaced by a "[...]" marker. Returns the markdown unchanged if nothing matches
+    or nothing would be dropped.
+
+    Only worth calling on invoices that routing says hold several booking types —
+    a single-type invoice is all relevant by definition.
+    """
+    lines = markdown.splitlines()
+    keep = [False] * len(lines)
+    keep[:header_lines] = [True] * min(header_lines, len(lines))
+
+    matched = False
+    for i, line in enumerate(lines):
+        if pattern.search(line):
+            matched = True
+            start, end = max(0, i - context_lines), min(len(lines), i + context_lines + 1)
+            keep[start:end] = [True] * (end - start)
+
+    if not matched or all(keep):
+        return markdown
+
+    out = []
+    for line, kept in zip(lines, keep):
+        if kept:
+            out.append(line)
+        elif not out or out[-1] != "[...]":
+            out.append("[...]")
+    return "\n".join(out)
+
+
+def invoice_user_content(
+    markdown: str,
+    vendor: str,
+    rule_set: str,
+    exchange_rate_note: str | None,
+    today_date: str,
+    instruction: str,
+) -> str:
+    """Build the user message shared by the rule-set extractors' build_request().
+
+    Vendor and rule set header, optional TODAY'S DATE line, the invoice markdown,
+    the live exchange rate note (if the invoice isn't in CAD), then the extractor's
+    closing instruction.
+    """
+    rate_line = f"\n{exchange_rate_note}\n" if exchange_rate_note else ""
+    date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
+    return (
+        f"VENDOR: {vendor}\n"
+        f"RULE SET: {rule_set}\n"
+        f"{date_line}\n"
+        f"INVOICE MARKDOWN:\n{markdown}\n"
+        f"{rate_line}\n"
+        f"{instruction}"
+    )
+
+
+# Letters NFD doesn't decompose into base letter + accent.
+_LIGATURES = str.maketrans({
+    "ß": "ss", "æ": "ae", "Æ": "AE", "œ": "oe", "Œ": "OE",
+    "ø": "o", "Ø": "O", "ł": "l", "Ł": "L", "đ": "d", "Đ": "D",
+})
+
+
+def _fold_accents(value):
+    """Replace accented letters with their unaccented ASCII equivalent, recursively.
+
+    ClientBase Online garbles accented characters, so every string in the parsed
+    sections is folded here ("Hôtel de Varenne" → "Hotel de Varenne") rather than
+    asking the model to do it. Other non-ASCII characters (€, —) are left as-is.
+    """
+    if isinstance(value, str):
+        if value.isascii():
+            return value
+        decomposed = unicodedata.normalize("NFD", value.translate(_LIGATURES))
+        return unicodedata.normalize(
+            "NFC", "".join(c for c in decomposed if not unicodedata.combining(c))
+        )
+    if isinstance(value, list):
+        return [_fold_accents(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _fold_accents(item) for key, item in value.items()}
+    return value
+
+
+# Code fence around the JSON array, e.g. ```json\n[...]\n```
+_FENCE_RE = re.compile(r"```(?:json)?\s*\n?([\s\S]*?)\n?\s*```")
+
+
+def _repair_json(raw: str) -> str:
+    """Fix the two near-misses seen in extractor output, leaving strings untouched.
+
+    Drops trailing commas before '}' / ']' and anything after the bracket that
+    closes the outermost array or object (e.g. a closing remark from Claude).
+    """
+    out: list[str] = []
+    depth = 0
+    in_string = escaped = False
+    for ch in raw:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch in "}]":
+            end = len(out) - 1
+            while end >= 0 and out[end].isspace():
+                end -= 1
+            if end >= 0 and out[end] == ",":
+                del out[end]
+            out.append(ch)
+            depth -= 1
+            if depth == 0:
+                break
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        out.append(ch)
+    return "".join(out)
+
+
+def _parse_sections(message) -> list[dict]:
+    """Parse a Claude response message into the list of section dicts.
+
+    Raises:
+        orjson.JSONDecodeError: If Claude returns malformed JSON
+            (a json.JSONDecodeError subclass).
+        ValueError: If the response was truncated at max_tokens, or Claude returns
+            something other than a JSON array, or a section without a string
+            'sectionTitle' and a 'data' key.
+    """
     raw = message.content[0].text.strip()
 
-    # 1. If Claude wrapped output in a code fence, extract its contents
-    fence_match = re.search(r"```(?:json)?\s*\n?([\s\S]*?)\n?\s*```", raw)
+    # 1. If Claude wrapped output in a code fence, extract its contents.
+    #    The prompts ask for no fences, so skip the regex scan when there are none.
+    fence_match = _FENCE_RE.search(raw) if "```" in raw else None
     if fence_match:
         raw = fence_match.group(1).strip()
     else:
@@ -138,16 +595,44 @@ async def call_claude(
             raw = raw[bracket:]
         raw = raw.strip()
 
+    if message.stop_reason == "max_tokens":
+        # The array was cut off mid-way — fail with a clear cause instead of a JSON error.
+        print(f"[call_claude] response truncated at max_tokens "
+              f"(output_tokens={message.usage.output_tokens})")
+        raise ValueError(
+            f"Extractor response truncated at max_tokens "
+            f"({message.usage.output_tokens} output tokens)"
+        )
+
     try:
-        parsed = json.loads(raw)
-    except json.JSONDecodeError as e:
-        safe_preview = raw[:500].encode("ascii", "replace").decode("ascii")
-        print(f"[call_claude] JSON parse failed: {e}")
-        print(f"[call_claude] stop_reason={message.stop_reason!r}  content_length={len(raw)}")
-        print(f"[call_claude] raw response (first 500 chars): {safe_preview!r}")
-        raise
+        parsed = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        # 3. Near-miss output (trailing comma, prose after the array) is repaired
+        #    deterministically rather than failing the whole extractor.
+        try:
+            parsed = orjson.loads(_repair_json(raw))
+            print(f"[call_claude] JSON parse failed ({e}); repaired response parsed")
+        except orjson.JSONDecodeError:
+            safe_preview = raw[:500].encode("ascii", "replace").decode("ascii")
+            print(f"[call_claude] JSON parse failed: {e}")
+            print(f"[call_claude] stop_reason={message.stop_reason!r}  content_length={len(raw)}")
+            print(f"[call_claude] raw response (first 500 chars): {safe_preview!r}")
+            raise e
 
     if not isinstance(parsed, list):
         raise ValueError(f"Expected JSON array from extractor, got: {type(parsed)}")
 
-    return parsed
+    # Every section must be {"sectionTitle": str, "data": ...} — email_sender and the
+    # n8n callback index into both keys, so reject malformed output here where the
+    # error is attributed to the extractor instead of failing later in the pipeline.
+    for i, section in enumerate(parsed):
+        if not (
+            isinstance(section, dict)
+            and isinstance(section.get("sectionTitle"), str)
+            and "data" in section
+        ):
+            raise ValueError(
+                f"Extractor section {i} is missing 'sectionTitle'/'data': {str(section)[:200]!r}"
+            )
+
+    return _fold_accents(parsed)
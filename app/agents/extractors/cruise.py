@@ -6,7 +6,19 @@ Cruise invoices often include itinerary text blocks — preserve these in client
 Non-CAD invoices must have agentRemarks with conversion details.
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+import re
+
+from app.agents.extractors.base import (
+    AGENT_REMARKS_TEMPLATE,
+    GLOBAL_RULES,
+    call_claude,
+    trim_markdown,
+)
+
+# Lines that belong to the cruise part of a multi-booking invoice (see trim_markdown).
+_CRUISE_LINE_RE = re.compile(
+    r"cruise|ship|cabin|stateroom|embark|sail|deck|gratuit|port charge", re.IGNORECASE
+)
 
 _SYSTEM_PROMPT = f"""\
 You are a cruise booking data extraction specialist for a travel agency (ClientBase Online).
@@ -30,10 +42,7 @@ exclusions — keep notes focused on inclusions, discounts, and the itinerary.
 
 CURRENCY NOTE: If the invoice is NOT in CAD, convert totalBase to CAD using the best
 available exchange rate and populate agentRemarks:
-  DEPOSIT PAID: $[CAD amount] CAD
-  COMMISSION: [raw amount] [currency]
-  Invoiced in [currency] by Supplier
-  Amounts in CB Converted to CAD on [MM/DD/YY] @ rate of 1 [currency] : [rate] CAD
+{AGENT_REMARKS_TEMPLATE}
 
 ═══════════════════════════════════════════════
 SCHEMA — 2 sections required
@@ -80,19 +89,21 @@ Return ONLY the JSON array. No prose, no markdown fences.\
 """
 
 
-async def run(
+# Output ceiling: 2 sections, but Screen 2 holds the port-by-port itinerary.
+_MAX_TOKENS = 4096
+
+
+def build_request(
     markdown: str,
     routing: dict,
     exchange_rate_note: str | None = None,
     today_date: str = "",
     source_blocks: list[dict] | None = None,
-) -> list[dict]:
-    """Extract cruise sections from invoice Markdown.
+) -> dict:
+    """Build the call_claude() request for a cruise extraction (see run())."""
+    if len(routing.get("bookingTypes", [])) > 1:
+        markdown = trim_markdown(markdown, _CRUISE_LINE_RE)
 
-    When source_blocks are provided, Sonnet re-reads the raw supplier document
-    directly — needed for the port-by-port "Itinerary at a glance" block, which
-    Agent 1's LABEL:value filter strips out.
-    """
     rate_line = f"\n{exchange_rate_note}\n" if exchange_rate_note else ""
     date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
 
@@ -115,4 +126,24 @@ async def run(
     else:
         user_content = instruction_text
 
-    return await call_claude(_SYSTEM_PROMPT, user_content, max_tokens=4096)
+    return {"system_prompt": _SYSTEM_PROMPT, "user_content": user_content, "max_tokens": _MAX_TOKENS}
+
+
+async def run(
+    markdown: str,
+    routing: dict,
+    exchange_rate_note: str | None = None,
+    today_date: str = "",
+    source_blocks: list[dict] | None = None,
+) -> list[dict]:
+    """Extract cruise sections from invoice Markdown.
+
+    When source_blocks are provided, Sonnet re-reads the raw supplier document
+    directly — needed for the port-by-port "Itinerary at a glance" block, which
+    Agent 1's LABEL:value filter strips out.
+    """
+    return await call_claude(
+        **build_request(
+            markdown, routing, exchange_rate_note, today_date, source_blocks=source_blocks,
+        )
+    )
@@ -7,19 +7,35 @@ Currency detection and live exchange rate fetching.
                        or None if the invoice is already in CAD
 
 frankfurter.dev is free, requires no API key, and sources daily rates from the
-European Central Bank. httpx is already a project dependency.
+European Central Bank. Requests go through the shared pooled httpx client
+(app/http_client.py), so a warm container reuses its keep-alive connection.
 
 Note: the old `api.frankfurter.app` host now returns HTTP 301 → `api.frankfurter.dev/v1/...`.
 We hit the new canonical URL directly; don't regress back to the .app host.
 """
 
+import asyncio
 import re
+from collections import defaultdict
 from datetime import date
 
-import httpx
+import orjson
+
+from app.http_client import get_client
 
 FRANKFURTER_URL = "https://api.frankfurter.dev/v1/latest"
 
+_CURRENCY_RE = re.compile(r"\bcurrency\s*[:\-]\s*([A-Z]{3})\b", re.IGNORECASE)
+
+# ECB rates only change once per day, so cache per (currency, ISO date) for the life
+# of the container. Entries from previous days are dropped on the next fetch, which
+# keeps the dict bounded to today's currencies. The per-key lock makes concurrent
+# invoices in the same currency share one HTTP call instead of racing. Locks are
+# per event loop (see _rate_lock()), like base's client and semaphore.
+_RATE_CACHE: dict[tuple[str, str], float] = {}
+_RATE_LOCKS: defaultdict[tuple[str, str], asyncio.Lock] = defaultdict(asyncio.Lock)
+_RATE_LOCKS_LOOP: asyncio.AbstractEventLoop | None = None
+
 
 def detect_currency(markdown: str) -> str:
     """Extract the invoice currency code from Agent 1 markdown output.
@@ -27,12 +43,26 @@ def detect_currency(markdown: str) -> str:
     Looks for a line like:  Currency: EUR  or  CURRENCY: USD
     Returns a 3-letter uppercase ISO code, or 'CAD' if not found.
     """
-    match = re.search(r"(?i)\bcurrency\s*[:\-]\s*([A-Z]{3})\b", markdown)
+    match = _CURRENCY_RE.search(markdown)
     if match:
         return match.group(1).upper()
     return "CAD"
 
 
+def _rate_lock(key: tuple[str, str]) -> asyncio.Lock:
+    """The fetch lock for one (currency, date) key on the running event loop.
+
+    A contended asyncio.Lock is bound to its loop, so a new loop (e.g. a fresh
+    asyncio.run()) starts from a fresh set of locks rather than one that raises.
+    """
+    global _RATE_LOCKS, _RATE_LOCKS_LOOP
+    loop = asyncio.get_running_loop()
+    if _RATE_LOCKS_LOOP is not loop:
+        _RATE_LOCKS = defaultdict(asyncio.Lock)
+        _RATE_LOCKS_LOOP = loop
+    return _RATE_LOCKS[key]
+
+
 async def fetch_rate(from_currency: str) -> float:
     """Fetch live exchange rate: 1 [from_currency] = X CAD.
 
@@ -45,14 +75,33 @@ async def fetch_rate(from_currency: str) -> float:
     Raises:
         httpx.HTTPStatusError: Non-2xx response from API.
         KeyError: CAD not in response (shouldn't happen with this API).
+
+    Successful rates are cached for the rest of the day (see _RATE_CACHE);
+    failures are not cached, so the next invoice retries the API.
     """
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(
+    today = date.today().isoformat()
+    key = (from_currency, today)
+    if key in _RATE_CACHE:
+        return _RATE_CACHE[key]
+
+    async with _rate_lock(key):
+        # Another task may have fetched the rate while we waited for the lock.
+        if key in _RATE_CACHE:
+            return _RATE_CACHE[key]
+
+        resp = await get_client().get(
             FRANKFURTER_URL,
             params={"from": from_currency, "to": "CAD"},
+            timeout=10.0,
         )
         resp.raise_for_status()
-        return resp.json()["rates"]["CAD"]
+        rate = orjson.loads(resp.content)["rates"]["CAD"]
+
+        for stale in [k for k in _RATE_CACHE if k[1] != today]:
+            del _RATE_CACHE[stale]
+            _RATE_LOCKS.pop(stale, None)
+        _RATE_CACHE[key] = rate
+        return rate
 
 
 async def build_rate_note(markdown: str) -> str | None:
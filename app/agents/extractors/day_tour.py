@@ -10,7 +10,17 @@ Output:
     see VIATOR_RULES for the BR-#### splitting rule)
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+import re
+
+from app.agents.extractors.base import (
+    AGENT_REMARKS_TEMPLATE,
+    GLOBAL_RULES,
+    call_claude,
+    invoice_user_content,
+)
+
+# Viator booking references — one Screen 1 + Screen 2 pair is generated per BR-####.
+_BR_RE = re.compile(r"BR-\d+")
 
 # ── Vendor-specific rules ──────────────────────────────────────────────────────
 
@@ -68,11 +78,7 @@ SHARED FINANCIAL RULES:
 - If the invoice is NOT in CAD: convert basePrice to CAD using the provided exchange rate.
   Record commission in the original invoice currency — do NOT convert commission to CAD.
   Then populate agentRemarks with:
-    DEPOSIT PAID: $[CAD amount] CAD
-    COMMISSION: [raw amount] [currency]
-    Invoiced in [currency] by Supplier
-    Amounts in CB Converted to CAD on [MM/DD/YY] @ rate of 1 [currency] : [rate] CAD\
-"""
+""" + AGENT_REMARKS_TEMPLATE
 
 # ── System prompt ──────────────────────────────────────────────────────────────
 
@@ -146,26 +152,53 @@ def _build_system_prompt(rule_set: str) -> str:
     )
 
 
-async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
-    """Extract day tour sections from a day-tour invoice Markdown."""
+# Assembled once per rule set at import; unknown rule sets use the generic prompt.
+_SYSTEM_PROMPTS = {rule_set: _build_system_prompt(rule_set) for rule_set in [*RULE_SET_MAP, "generic"]}
+
+
+def build_request(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> dict:
+    """Build the call_claude() request for a day tour extraction (see run())."""
+    # Never trimmed for multi-booking invoices (unlike cruise): day tours have no
+    # source_blocks fallback, so totals, deposit, commission and passenger lines
+    # outside the keyword windows would be lost.
     rule_set = routing.get("ruleSet", "viator")
     vendor   = routing.get("vendor", "Viator on Line")
-    system_prompt = _build_system_prompt(rule_set)
+    system_prompt = _SYSTEM_PROMPTS.get(rule_set, _SYSTEM_PROMPTS["generic"])
 
-    rate_line = f"\n{exchange_rate_note}\n" if exchange_rate_note else ""
-    date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
     pairing_hint = (
         "Remember: each BR-#### is a separate booking — output one Screen 1 + one Screen 2 per BR-####, paired in order."
         if rule_set == "viator"
         else "Output one Screen 1 + one Screen 2 per booking on the invoice, paired in order."
     )
-    user_content = (
-        f"VENDOR: {vendor}\n"
-        f"RULE SET: {rule_set}\n"
-        f"{date_line}\n"
-        f"INVOICE MARKDOWN:\n{markdown}\n"
-        f"{rate_line}\n"
-        f"Extract all day tour data and return the JSON array. {pairing_hint}"
+    user_content = invoice_user_content(
+        markdown, vendor, rule_set, exchange_rate_note, today_date,
+        f"Extract all day tour data and return the JSON array. {pairing_hint}",
     )
 
-    return await call_claude(system_prompt, user_content, max_tokens=4096)
+    return {
+        "system_prompt": system_prompt,
+        "user_content": user_content,
+        "max_tokens": _max_tokens(rule_set, markdown),
+    }
+
+
+def _max_tokens(rule_set: str, markdown: str) -> int:
+    """Output budget: scaled by BR-#### count for Viator, the full 4096 otherwise.
+
+    Each Screen 1 + Screen 2 pair is roughly 500–700 tokens; a smaller ceiling lets
+    the API schedule single-booking Viator invoices as short requests. Other day-tour
+    vendors have no reliable per-booking marker, so they keep the fixed ceiling — as
+    does a Viator invoice with no BR-#### refs (missing or in another format), since
+    the booking count is then unknown.
+    """
+    if rule_set != "viator":
+        return 4096
+    bookings = len(set(_BR_RE.findall(markdown)))
+    if not bookings:
+        return 4096
+    return min(4096, 1024 + 768 * bookings)
+
+
+async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
+    """Extract day tour sections from a day-tour invoice Markdown."""
+    return await call_claude(**build_request(markdown, routing, exchange_rate_note, today_date))
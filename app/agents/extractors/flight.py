@@ -11,7 +11,7 @@ No code change is required when rates are updated — just drop a new .md file
 in docs/Commissions/ and redeploy.
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+from app.agents.extractors.base import GLOBAL_RULES, call_claude, invoice_user_content
 from app.agents.commissions.loader import load_all as _load_commission_docs
 
 # ── Vendor-specific rules ──────────────────────────────────────────────────────
@@ -440,20 +440,8 @@ Example (WestJet, call centre):
 """
 
 
-async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
-    """Extract flight sections from invoice Markdown.
-
-    Args:
-        markdown:           Full invoice content from Agent 1.
-        routing:            Routing result from Agent 2 (vendor, ruleSet, bookingTypes).
-        exchange_rate_note: Live rate string from currency.py, or None if invoice is CAD.
-        today_date:         Today's date (MM/DD/YY) as fallback for missing booking dates.
-
-    Returns:
-        List of 2–5 section dicts. Tourcan: 2 (Summary, Segments). All others: 3 (+ Passengers),
-        or +2 if seat charges are present on the invoice.
-    """
-    rule_set = routing.get("ruleSet", "generic")
+def _build_system_prompt(rule_set: str) -> str:
+    """Format the full flight system prompt for one rule set."""
     vendor_rules = RULE_SET_MAP.get(rule_set, GENERIC_FLIGHT_RULES)
     section1_schema = (
         _SECTION1_SUMMARY_ONLY if rule_set in _TICKETING_VENDORS else _SECTION1_FULL
@@ -476,7 +464,7 @@ async def run(markdown: str, routing: dict, exchange_rate_note: str | None = Non
                 commission_docs=commission_docs,
             )
 
-    system = _SYSTEM_PROMPT_TEMPLATE.format(
+    return _SYSTEM_PROMPT_TEMPLATE.format(
         vendor_rules=vendor_rules,
         global_rules=GLOBAL_RULES,
         section1_schema=section1_schema,
@@ -486,16 +474,47 @@ async def run(markdown: str, routing: dict, exchange_rate_note: str | None = Non
         commission_section=commission_section,
     )
 
-    rate_line = f"\n{exchange_rate_note}\n" if exchange_rate_note else ""
-    date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
-    seat_note = "" if no_pax_screen else ", or 5 if seat charges are present"
-    user_content = (
-        f"VENDOR: {routing.get('vendor', 'Unknown')}\n"
-        f"RULE SET: {rule_set}\n"
-        f"{date_line}\n"
-        f"INVOICE MARKDOWN:\n{markdown}\n"
-        f"{rate_line}\n"
-        f"Extract all flight data and return the JSON array of sections ({section_count} sections{seat_note})."
+
+# rule_set → (system prompt, has passenger screen). Every rule set's prompt is formatted
+# once at import (commission docs are fixed per deploy), so a request is one dict
+# lookup and the prompt-cache prefix is byte-stable. Unknown rule sets use "generic".
+_DISPATCH: dict[str, tuple[str, bool]] = {
+    rule_set: (_build_system_prompt(rule_set), rule_set not in _NO_PASSENGER_SCREEN_VENDORS)
+    for rule_set in [*RULE_SET_MAP, "generic"]
+}
+
+
+# Output ceiling: up to 5 sections, with one Screen 3 row per passenger and the
+# commission QA note — large group bookings need the full 8k.
+_MAX_TOKENS = 8192
+
+
+def build_request(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> dict:
+    """Build the call_claude() request for a flight extraction (see run())."""
+    rule_set = routing.get("ruleSet", "generic")
+    system, has_pax_screen = _DISPATCH.get(rule_set, _DISPATCH["generic"])
+    section_count = "3" if has_pax_screen else "2"
+
+    seat_note = ", or 5 if seat charges are present" if has_pax_screen else ""
+    user_content = invoice_user_content(
+        markdown, routing.get("vendor", "Unknown"), rule_set, exchange_rate_note, today_date,
+        f"Extract all flight data and return the JSON array of sections ({section_count} sections{seat_note}).",
     )
 
-    return await call_claude(system, user_content, max_tokens=8192)
+    return {"system_prompt": system, "user_content": user_content, "max_tokens": _MAX_TOKENS}
+
+
+async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
+    """Extract flight sections from invoice Markdown.
+
+    Args:
+        markdown:           Full invoice content from Agent 1.
+        routing:            Routing result from Agent 2 (vendor, ruleSet, bookingTypes).
+        exchange_rate_note: Live rate string from currency.py, or None if invoice is CAD.
+        today_date:         Today's date (MM/DD/YY) as fallback for missing booking dates.
+
+    Returns:
+        List of 2–5 section dicts. Tourcan: 2 (Summary, Segments). All others: 3 (+ Passengers),
+        or +2 if seat charges are present on the invoice.
+    """
+    return await call_claude(**build_request(markdown, routing, exchange_rate_note, today_date))
@@ -5,7 +5,7 @@ Outputs 2 sections: Summary, Details.
 The Details section MUST include the full hotel address, phone, and email in notesForClient.
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+from app.agents.extractors.base import GLOBAL_RULES, call_claude, invoice_user_content
 
 # ── Vendor-specific rules ──────────────────────────────────────────────────────
 
@@ -124,26 +124,34 @@ Return ONLY the JSON array. No prose, no markdown fences.\
 """
 
 
-async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
-    """Extract hotel sections from invoice Markdown."""
-    rule_set = routing.get("ruleSet", "generic")
-    vendor_rules = RULE_SET_MAP.get(rule_set, GENERIC_HOTEL_RULES)
-
-    system = _SYSTEM_PROMPT_TEMPLATE.format(
+# Formatted once per rule set at import; unknown rule sets use the generic prompt.
+_SYSTEM_PROMPTS = {
+    rule_set: _SYSTEM_PROMPT_TEMPLATE.format(
         vendor_rules=vendor_rules,
         multi_hotel_rule=MULTI_HOTEL_SPLIT_RULE,
         global_rules=GLOBAL_RULES,
     )
+    for rule_set, vendor_rules in {**RULE_SET_MAP, "generic": GENERIC_HOTEL_RULES}.items()
+}
+
+
+# Output ceiling: 2 sections per hotel (multi-hotel invoices are split, see above).
+_MAX_TOKENS = 3000
 
-    rate_line = f"\n{exchange_rate_note}\n" if exchange_rate_note else ""
-    date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
-    user_content = (
-        f"VENDOR: {routing.get('vendor', 'Unknown')}\n"
-        f"RULE SET: {rule_set}\n"
-        f"{date_line}\n"
-        f"INVOICE MARKDOWN:\n{markdown}\n"
-        f"{rate_line}\n"
-        "Extract all hotel data and return the JSON array of 2 section objects."
+
+def build_request(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> dict:
+    """Build the call_claude() request for a hotel extraction (see run())."""
+    rule_set = routing.get("ruleSet", "generic")
+    system = _SYSTEM_PROMPTS.get(rule_set, _SYSTEM_PROMPTS["generic"])
+
+    user_content = invoice_user_content(
+        markdown, routing.get("vendor", "Unknown"), rule_set, exchange_rate_note, today_date,
+        "Extract all hotel data and return the JSON array of 2 section objects.",
     )
 
-    return await call_claude(system, user_content, max_tokens=3000)
+    return {"system_prompt": system, "user_content": user_content, "max_tokens": _MAX_TOKENS}
+
+
+async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
+    """Extract hotel sections from invoice Markdown."""
+    return await call_claude(**build_request(markdown, routing, exchange_rate_note, today_date))
@@ -5,7 +5,7 @@ Outputs 2 sections: Summary, Details.
 Key rule: strip non-numeric characters from confirmationNumber (remove prefixes like AGX).
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+from app.agents.extractors.base import GLOBAL_RULES, call_claude, extractor_model
 
 _SYSTEM_PROMPT = f"""\
 You are an insurance booking data extraction specialist for a travel agency (ClientBase Online).
@@ -56,8 +56,12 @@ Return ONLY the JSON array. No prose, no markdown fences.\
 """
 
 
-async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
-    """Extract insurance sections from invoice Markdown."""
+# Output ceiling: 2 short sections.
+_MAX_TOKENS = 2000
+
+
+def build_request(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> dict:
+    """Build the call_claude() request for an insurance extraction (see run())."""
     date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
     user_content = (
         f"{date_line}\n"
@@ -65,4 +69,15 @@ async def run(markdown: str, routing: dict, exchange_rate_note: str | None = Non
         "Extract all insurance policy data and return the JSON array of 2 section objects."
     )
 
-    return await call_claude(_SYSTEM_PROMPT, user_content, max_tokens=2000)
+    # Flat, well-specified schema — a Haiku candidate (HAIKU_EXTRACTORS), Sonnet otherwise.
+    return {
+        "system_prompt": _SYSTEM_PROMPT,
+        "user_content": user_content,
+        "max_tokens": _MAX_TOKENS,
+        "model": extractor_model("insurance"),
+    }
+
+
+async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
+    """Extract insurance sections from invoice Markdown."""
+    return await call_claude(**build_request(markdown, routing, exchange_rate_note, today_date))
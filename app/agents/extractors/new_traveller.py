@@ -15,13 +15,13 @@ Key formatting rules:
   - phoneNumber: 7 digits only (no area code, no dashes)
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+from app.agents.extractors.base import PROFILE_GLOBAL_RULES, call_claude, extractor_model
 
 _SYSTEM_PROMPT = f"""\
 You are a new traveller profile extraction specialist for a travel agency (ClientBase Online).
 Extract data from the profile document and return ONLY a JSON array of section objects.
 
-{GLOBAL_RULES}
+{PROFILE_GLOBAL_RULES}
 
 FORMATTING RULES SPECIFIC TO PROFILES:
 - state / province: 2-letter code only (e.g., "ON", "BC", "AB", "NY")
@@ -115,11 +115,26 @@ Return ONLY the JSON array. No prose, no markdown fences.\
 """
 
 
-async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
-    """Extract new traveller profile sections from document."""
+# Output ceiling: contact, up to two travellers and a preferences block.
+_MAX_TOKENS = 3000
+
+
+def build_request(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> dict:
+    """Build the call_claude() request for a new traveller profile extraction (see run())."""
     user_content = (
         f"PROFILE DOCUMENT:\n{markdown}\n\n"
         "Extract all traveller profile data and return the JSON array of section objects."
     )
 
-    return await call_claude(_SYSTEM_PROMPT, user_content, max_tokens=3000)
+    # Profile fields are copied, not computed — a Haiku candidate (HAIKU_EXTRACTORS).
+    return {
+        "system_prompt": _SYSTEM_PROMPT,
+        "user_content": user_content,
+        "max_tokens": _MAX_TOKENS,
+        "model": extractor_model("new_traveller"),
+    }
+
+
+async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
+    """Extract new traveller profile sections from document."""
+    return await call_claude(**build_request(markdown, routing, exchange_rate_note, today_date))
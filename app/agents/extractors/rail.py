@@ -9,7 +9,7 @@ Output:
   - N × Screen 2 (Details) — one section per rail segment (one train leg = one section)
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+from app.agents.extractors.base import GLOBAL_RULES, call_claude, invoice_user_content
 
 # ── Vendor-specific rules ──────────────────────────────────────────────────────
 
@@ -157,6 +157,34 @@ Return ONLY the JSON array. No prose, no markdown fences.\
 """
 
 
+# Output ceiling: one Screen 2 section per rail segment, so multi-leg passes run long.
+_MAX_TOKENS = 8192
+
+
+# Formatted once per rule set at import (RULE_SET_MAP already holds "generic", the
+# fallback for unknown rule sets).
+_SYSTEM_PROMPTS = {
+    rule_set: _SYSTEM_PROMPT.format(vendor_rules=vendor_rules, global_rules=GLOBAL_RULES)
+    for rule_set, vendor_rules in RULE_SET_MAP.items()
+}
+
+
+def build_request(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> dict:
+    """Build the call_claude() request for a rail extraction (see run())."""
+    rule_set = routing.get("ruleSet", "generic")
+    system = _SYSTEM_PROMPTS.get(rule_set, _SYSTEM_PROMPTS["generic"])
+
+    user_content = invoice_user_content(
+        markdown, routing.get("vendor", "Unknown"), rule_set, exchange_rate_note, today_date,
+        (
+            "Extract all rail booking data and return the JSON array. "
+            "Remember: one Screen 2 section per rail segment — separate train legs are separate sections."
+        ),
+    )
+
+    return {"system_prompt": system, "user_content": user_content, "max_tokens": _MAX_TOKENS}
+
+
 async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
     """Extract rail booking sections from invoice Markdown.
 
@@ -170,24 +198,4 @@ async def run(markdown: str, routing: dict, exchange_rate_note: str | None = Non
         List of 1 + N section dicts: Rail Screen 1 Summary, then one Rail Screen 2 Details
         per segment.
     """
-    rule_set = routing.get("ruleSet", "generic")
-    vendor_rules = RULE_SET_MAP.get(rule_set, GENERIC_RAIL_RULES)
-
-    system = _SYSTEM_PROMPT.format(
-        vendor_rules=vendor_rules,
-        global_rules=GLOBAL_RULES,
-    )
-
-    rate_line = f"\n{exchange_rate_note}\n" if exchange_rate_note else ""
-    date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
-    user_content = (
-        f"VENDOR: {routing.get('vendor', 'Unknown')}\n"
-        f"RULE SET: {rule_set}\n"
-        f"{date_line}\n"
-        f"INVOICE MARKDOWN:\n{markdown}\n"
-        f"{rate_line}\n"
-        "Extract all rail booking data and return the JSON array. "
-        "Remember: one Screen 2 section per rail segment — separate train legs are separate sections."
-    )
-
-    return await call_claude(system, user_content, max_tokens=8192)
+    return await call_claude(**build_request(markdown, routing, exchange_rate_note, today_date))
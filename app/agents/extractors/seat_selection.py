@@ -71,8 +71,12 @@ Return ONLY the JSON array. No prose, no markdown fences.\
 """
 
 
-async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
-    """Extract seat selection charge sections from a standalone seat invoice."""
+# Output ceiling: 2 short sections.
+_MAX_TOKENS = 2000
+
+
+def build_request(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> dict:
+    """Build the call_claude() request for a seat selection extraction (see run())."""
     date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
     user_content = (
         f"VENDOR: {routing.get('vendor', 'Unknown')}\n"
@@ -82,4 +86,9 @@ async def run(markdown: str, routing: dict, exchange_rate_note: str | None = Non
         "Extract all seat selection charge data and return the JSON array of 2 section objects."
     )
 
-    return await call_claude(_SYSTEM_PROMPT, user_content, max_tokens=2000)
+    return {"system_prompt": _SYSTEM_PROMPT, "user_content": user_content, "max_tokens": _MAX_TOKENS}
+
+
+async def run(markdown: str, routing: dict, exchange_rate_note: str | None = None, today_date: str = "") -> list[dict]:
+    """Extract seat selection charge sections from a standalone seat invoice."""
+    return await call_claude(**build_request(markdown, routing, exchange_rate_note, today_date))
@@ -2,42 +2,85 @@
 Agent 3f: Service Fee Extractor
 
 Service fees are generated primarily from form data, not the invoice.
-Uses a small Claude call only to determine the passenger count from the Markdown.
+The passenger count and trip dates are read from the sections the booking
+extractors already produced; a small Claude call on the Markdown fills in only
+what those sections don't carry (e.g. pax on a Tourcan flight-only invoice), and
+is never made when they carry all three fields.
 Outputs 2 sections: Summary, Details.
 """
 
-from datetime import date
-from app.agents.extractors.base import call_claude
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import date, datetime
+
+import anthropic
+
+from app.agents.extractors.base import HAIKU_MODEL, anthropic_client, api_slots
+
+# Booking-section fields that carry the pax count / trip dates, across extractors
+# (flight segments use lowercase startdate / enddate; hotels use check-in / out).
+_PAX_FIELDS = ("noofpax", "numberOfTravellers", "numberOfGuests")
+_START_FIELDS = ("startDate", "startdate", "checkInDate")
+_END_FIELDS = ("endDate", "enddate", "checkOutDate")
+_PASSENGERS_SECTION = "Flight Screen 3 (Passengers)"
+
+# Fallback context per invoice (blake2b of the markdown), so a replayed or retried
+# invoice on a warm container skips the Claude call. LRU-bounded like base's cache.
+_CONTEXT_CACHE: OrderedDict[str, dict] = OrderedDict()
+_CONTEXT_CACHE_SIZE = 256
 
 _CONTEXT_PROMPT_SYSTEM = """\
-You are a data extraction assistant. Read the invoice Markdown and return ONLY a JSON object
+You are a data extraction assistant. Read the invoice Markdown and call emit_context
 with these three fields:
 
   noofpax   — total number of travellers/passengers (integer, default 1 if unknown)
   startDate — first departure / check-in / tour start date in MM/DD/YY format
   endDate   — last arrival / check-out / tour end date in MM/DD/YY format
 
-Omit startDate or endDate if they cannot be determined from the invoice.
-
-Example output:
-{"noofpax": 2, "startDate": "08/26/24", "endDate": "09/02/24"}\
+Omit startDate or endDate if they cannot be determined from the invoice.\
 """
 
+# Forced tool call: the API returns the context as an already-parsed dict
+# (tool_use.input), so there is no text reply to un-fence or JSON-decode.
+_CONTEXT_TOOL = {
+    "name": "emit_context",
+    "description": "Report the invoice's passenger count and trip dates.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "noofpax": {"type": "integer", "description": "Total number of travellers"},
+            "startDate": {"type": "string", "description": "MM/DD/YY"},
+            "endDate": {"type": "string", "description": "MM/DD/YY"},
+        },
+        "required": ["noofpax"],
+    },
+}
+
 
 async def _get_invoice_context(markdown: str) -> dict:
-    """Single Claude call to extract pax count and trip dates from invoice."""
-    import asyncio, json, re, anthropic
+    """Single Claude call to extract pax count and trip dates from invoice.
+
+    Results are memoized per markdown in _CONTEXT_CACHE.
+    """
+    key = hashlib.blake2b(markdown.encode(), digest_size=16).hexdigest()
+    if key in _CONTEXT_CACHE:
+        _CONTEXT_CACHE.move_to_end(key)
+        return dict(_CONTEXT_CACHE[key])
 
-    client = anthropic.AsyncAnthropic(max_retries=6)
     app_retries = 8
     for attempt in range(app_retries + 1):
         try:
-            message = await client.messages.create(
-                model="claude-sonnet-4-6",
-                max_tokens=64,
-                system=_CONTEXT_PROMPT_SYSTEM,
-                messages=[{"role": "user", "content": markdown}],
-            )
+            # base's shared client — pooled connections, same max_retries=6.
+            async with api_slots():
+                message = await anthropic_client().messages.create(
+                    model=HAIKU_MODEL,  # three fields copied off the invoice — no Sonnet needed
+                    max_tokens=128,  # tool_use block overhead + ~30 tokens of input
+                    system=_CONTEXT_PROMPT_SYSTEM,
+                    tools=[_CONTEXT_TOOL],
+                    tool_choice={"type": "tool", "name": _CONTEXT_TOOL["name"]},
+                    messages=[{"role": "user", "content": markdown}],
+                )
             break
         except (anthropic.APIConnectionError, anthropic.APITimeoutError) as e:
             if attempt < app_retries:
@@ -55,25 +98,88 @@ async def _get_invoice_context(markdown: str) -> dict:
                 await asyncio.sleep(delay)
                 continue
             raise
-    raw = message.content[0].text.strip()
-    raw = re.sub(r"^```(?:json)?\s*", "", raw)
-    raw = re.sub(r"\s*```\s*$", "", raw)
-    return json.loads(raw.strip())
+    for block in message.content:
+        if block.type == "tool_use":
+            _CONTEXT_CACHE[key] = dict(block.input)
+            if len(_CONTEXT_CACHE) > _CONTEXT_CACHE_SIZE:
+                _CONTEXT_CACHE.popitem(last=False)
+            return dict(block.input)
+    raise ValueError(f"No {_CONTEXT_TOOL['name']} call in service fee response")
+
+
+def _context_from_sections(sections: list[dict]) -> dict:
+    """Pax count and trip dates from already-extracted booking sections.
+
+    noofpax is the largest traveller count any section reports (or the number of
+    flight passengers); startDate / endDate span the earliest start and latest end.
+    Fields no section provides are left out of the returned dict.
+    """
+    pax_counts = []
+    starts, ends = [], []
+    for section in sections:
+        data = section.get("data")
+        if section.get("sectionTitle") == _PASSENGERS_SECTION and isinstance(data, list):
+            pax_counts.append(len(data))
+        for record in data if isinstance(data, list) else [data]:
+            if not isinstance(record, dict):
+                continue
+            pax_counts += [n for f in _PAX_FIELDS if (n := _as_count(record.get(f)))]
+            starts += [d for f in _START_FIELDS if (d := _as_date(record.get(f)))]
+            ends += [d for f in _END_FIELDS if (d := _as_date(record.get(f)))]
+
+    context = {}
+    if pax_counts:
+        context["noofpax"] = max(pax_counts)
+    if starts:
+        context["startDate"] = min(starts).strftime("%m/%d/%y")
+    if ends:
+        context["endDate"] = max(ends).strftime("%m/%d/%y")
+    return context
+
+
+def _as_count(value) -> int | None:
+    """Positive integer from a count field ("2", 2), or None."""
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        return None
+    return count if count > 0 else None
+
+
+def _as_date(value) -> datetime | None:
+    """Parse an MM/DD/YY field, or None if it's empty / not in that format."""
+    try:
+        return datetime.strptime(value, "%m/%d/%y")
+    except (TypeError, ValueError):
+        return None
 
 
-async def run(markdown: str, routing: dict, service_fee_amount: float) -> list[dict]:
+async def run(
+    markdown: str,
+    routing: dict,
+    service_fee_amount: float,
+    sections: list[dict] | None = None,
+    today_date: str = "",
+) -> list[dict]:
     """Generate service fee sections from form data + invoice context.
 
     Args:
-        markdown:           Invoice Markdown (used only to infer passenger count).
+        markdown:           Invoice Markdown (fallback source for pax count and dates).
         routing:            Routing result (not used directly here).
         service_fee_amount: Dollar amount from the n8n form service_fee field.
+        sections:           Sections the booking extractors produced for this invoice.
+                            The Claude call is only made if these lack pax or dates.
+        today_date:         The run's date (MM/DD/YY) from the orchestrator, so the fee
+                            matches the extractors' date; defaults to today.
 
     Returns:
         List of 2 section dicts (Service Fee Summary and Details).
     """
-    today = date.today().strftime("%m/%d/%y")
-    context = await _get_invoice_context(markdown)
+    today = today_date or date.today().strftime("%m/%d/%y")
+    context = _context_from_sections(sections or [])
+    if len(context) < 3:
+        fallback = await _get_invoice_context(markdown)
+        context = {**fallback, **context}
 
     noofpax = str(context.get("noofpax", 1))
     start_date = context.get("startDate", today)
@@ -19,7 +19,7 @@ Note on currency: If the invoice is NOT in CAD, Claude must include conversion d
 in agentRemarks (the model uses its best available rate knowledge and flags for verification).
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+from app.agents.extractors.base import AGENT_REMARKS_TEMPLATE, GLOBAL_RULES, call_claude
 
 # ── Vendor-specific rules ──────────────────────────────────────────────────────
 
@@ -45,10 +45,7 @@ VENDOR RULES — TRAVEL BRANDS / INTAIR (Tour):
 - If the invoice is NOT in CAD: convert totalBase (basePrice) to CAD using the exchange rate.
   Do NOT convert commission — record it in the original invoice currency.
   Then populate agentRemarks with:
-    DEPOSIT PAID: $[CAD amount] CAD
-    COMMISSION: [raw amount] [currency]
-    Invoiced in [currency] by Supplier
-    Amounts in CB Converted to CAD on [MM/DD/YY] @ rate of 1 [currency] : [rate] CAD
+""" + AGENT_REMARKS_TEMPLATE + """
 - finalPaymentDue: use the "Final Payment Due" or "Balance Due" date on the invoice.
 
 """ + BASEPRICE_AND_FINAL_PAYMENT_RULES
@@ -196,27 +193,31 @@ _CLIENT_FEEDBACK_RULES = (
 )
 
 
-async def run(
-    markdown: str,
-    routing: dict,
-    exchange_rate_note: str | None = None,
-    today_date: str = "",
-    source_blocks: list[dict] | None = None,
-) -> list[dict]:
-    """Extract tour sections from invoice Markdown.
+# Output ceiling: clientFeedback carries the full day-by-day itinerary.
+_MAX_TOKENS = 8192
 
-    When source_blocks are provided, Sonnet re-reads the raw supplier document
-    directly — necessary for the day-by-day "Itinerary at a glance" block, which
-    relies on per-day headings that Agent 1's LABEL:value filter strips out.
-    """
-    rule_set = routing.get("ruleSet", "generic")
-    vendor_rules = RULE_SET_MAP.get(rule_set, GENERIC_TOUR_RULES)
 
-    system = _SYSTEM_PROMPT_TEMPLATE.format(
+# Formatted once per rule set at import; unknown rule sets use the generic prompt.
+_SYSTEM_PROMPTS = {
+    rule_set: _SYSTEM_PROMPT_TEMPLATE.format(
         vendor_rules=vendor_rules,
         global_rules=GLOBAL_RULES,
         client_feedback_rules=_CLIENT_FEEDBACK_RULES,
     )
+    for rule_set, vendor_rules in {**RULE_SET_MAP, "generic": GENERIC_TOUR_RULES}.items()
+}
+
+
+def build_request(
+    markdown: str,
+    routing: dict,
+    exchange_rate_note: str | None = None,
+    today_date: str = "",
+    source_blocks: list[dict] | None = None,
+) -> dict:
+    """Build the call_claude() request for a tour extraction (see run())."""
+    rule_set = routing.get("ruleSet", "generic")
+    system = _SYSTEM_PROMPTS.get(rule_set, _SYSTEM_PROMPTS["generic"])
 
     rate_line = f"\n{exchange_rate_note}\n" if exchange_rate_note else ""
     date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
@@ -241,4 +242,24 @@ async def run(
     else:
         user_content = instruction_text
 
-    return await call_claude(system, user_content, max_tokens=8192)
+    return {"system_prompt": system, "user_content": user_content, "max_tokens": _MAX_TOKENS}
+
+
+async def run(
+    markdown: str,
+    routing: dict,
+    exchange_rate_note: str | None = None,
+    today_date: str = "",
+    source_blocks: list[dict] | None = None,
+) -> list[dict]:
+    """Extract tour sections from invoice Markdown.
+
+    When source_blocks are provided, Sonnet re-reads the raw supplier document
+    directly — necessary for the day-by-day "Itinerary at a glance" block, which
+    relies on per-day headings that Agent 1's LABEL:value filter strips out.
+    """
+    return await call_claude(
+        **build_request(
+            markdown, routing, exchange_rate_note, today_date, source_blocks=source_blocks,
+        )
+    )
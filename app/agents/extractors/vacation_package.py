@@ -23,7 +23,7 @@ insurance as part of the package — those screens are reserved for standalone
 Manulife Insurance invoices (ruleSet "manulife", insurance.py).
 """
 
-from app.agents.extractors.base import GLOBAL_RULES, call_claude
+from app.agents.extractors.base import GLOBAL_RULES, call_claude, invoice_user_content
 
 # ── Vendor-specific rules ──────────────────────────────────────────────────────
 
@@ -164,31 +164,43 @@ Return ONLY the JSON array. No prose, no markdown fences.\
 """
 
 
-async def run(
+# Output ceiling: tour summary plus every flight segment and hotel stay in the package.
+_MAX_TOKENS = 8192
+
+
+# Formatted once per rule set at import; unknown rule sets use the package prompt.
+_SYSTEM_PROMPTS = {
+    rule_set: _SYSTEM_PROMPT_TEMPLATE.format(vendor_rules=vendor_rules, global_rules=GLOBAL_RULES)
+    for rule_set, vendor_rules in RULE_SET_MAP.items()
+}
+
+
+def build_request(
     markdown: str,
     routing: dict,
     exchange_rate_note: str | None = None,
     today_date: str = "",
-) -> list[dict]:
-    """Extract vacation package sections (Tour Screen 1 + Flight Screen 2 + Hotel Screen 2)."""
+) -> dict:
+    """Build the call_claude() request for a vacation package extraction (see run())."""
     rule_set = routing.get("ruleSet", "vacation_package")
-    vendor_rules = RULE_SET_MAP.get(rule_set, PACKAGE_RULES)
-
-    system = _SYSTEM_PROMPT_TEMPLATE.format(
-        vendor_rules=vendor_rules,
-        global_rules=GLOBAL_RULES,
+    system = _SYSTEM_PROMPTS.get(rule_set, _SYSTEM_PROMPTS["vacation_package"])
+
+    user_content = invoice_user_content(
+        markdown, routing.get("vendor", "Unknown"), rule_set, exchange_rate_note, today_date,
+        (
+            "Extract all vacation package data and return the JSON array of sections "
+            "(1 Tour Screen 1 + 1 Flight Screen 2 + one Hotel Screen 2 per hotel stay)."
+        ),
     )
 
-    rate_line = f"\n{exchange_rate_note}\n" if exchange_rate_note else ""
-    date_line = f"TODAY'S DATE: {today_date}\n" if today_date else ""
-    user_content = (
-        f"VENDOR: {routing.get('vendor', 'Unknown')}\n"
-        f"RULE SET: {rule_set}\n"
-        f"{date_line}\n"
-        f"INVOICE MARKDOWN:\n{markdown}\n"
-        f"{rate_line}\n"
-        "Extract all vacation package data and return the JSON array of sections "
-        "(1 Tour Screen 1 + 1 Flight Screen 2 + one Hotel Screen 2 per hotel stay)."
-    )
+    return {"system_prompt": system, "user_content": user_content, "max_tokens": _MAX_TOKENS}
+
 
-    return await call_claude(system, user_content, max_tokens=8192)
+async def run(
+    markdown: str,
+    routing: dict,
+    exchange_rate_note: str | None = None,
+    today_date: str = "",
+) -> list[dict]:
+    """Extract vacation package sections (Tour Screen 1 + Flight Screen 2 + Hotel Screen 2)."""
+    return await call_claude(**build_request(markdown, routing, exchange_rate_note, today_date))
@@ -22,6 +22,13 @@ document hierarchy that downstream itinerary extractors rely on.
 and any embedded PDF attachments are extracted separately before sending to Claude.
 This prevents MIME-encoded base64 attachment data from being sent as raw text,
 which would consume 50,000+ tokens unnecessarily.
+
+run_batch() converts many invoices' files in one Message Batch (50% token cost,
+minutes instead of seconds) — for bulk / overnight runs, not the upload form.
+
+Oversized uploads (many attachments, long .eml threads) are token-counted before
+the real-time call and, if they would overflow Haiku's context, split across
+several concurrent calls whose extracts are concatenated.
 """
 
 import asyncio
@@ -29,6 +36,15 @@ import base64
 import email as email_lib
 import email.policy
 import anthropic
+import httpx
+
+from app.agents.extractors.base import (
+    HAIKU_MODEL,
+    anthropic_client,
+    api_slots,
+    cached_system,
+    call_claude_batch,
+)
 
 SYSTEM_PROMPT = """\
 You are a data extraction specialist for travel agency invoices.
@@ -55,6 +71,15 @@ policy number, premium, coverage dates, final payment due date,
 address, phone, email, date of birth, citizenship\
 """
 
+# Input budget per Haiku call (context is 200k; leave room for the 8k output).
+_MAX_INPUT_TOKENS = 150_000
+# Uploads smaller than this (base64 + text characters) can't approach the budget,
+# so they skip the count_tokens round trip.
+_COUNT_TOKENS_MIN_CHARS = 400_000
+# Estimate used when count_tokens fails. Counting base64 as text over-counts PDFs,
+# which is the safe direction: it can only split into more calls, never overflow.
+_CHARS_PER_TOKEN = 4
+
 
 def _parse_eml(raw_bytes: bytes) -> tuple[str, list[dict]]:
     """Parse a .eml file into body text and a list of PDF attachment dicts.
@@ -63,6 +88,18 @@ def _parse_eml(raw_bytes: bytes) -> tuple[str, list[dict]]:
     only the human-readable body and proper PDF blobs are returned.
     """
     msg = email_lib.message_from_bytes(raw_bytes, policy=email_lib.policy.default)
+
+    # Common forwarded-invoice case: a single text part with nothing to walk.
+    if (
+        msg.get_content_maintype() == "text"
+        and msg.get_content_subtype() in ("plain", "html")
+        and msg.get_content_disposition() != "attachment"
+    ):
+        try:
+            return msg.get_content(), []
+        except Exception:
+            return "", []
+
     body_parts: list[str] = []
     pdf_attachments: list[dict] = []
 
@@ -85,20 +122,54 @@ def _parse_eml(raw_bytes: bytes) -> tuple[str, list[dict]]:
             "attachment" in disposition
             and "pdf" in (part.get_filename() or "").lower()
         ):
-            payload = part.get_payload(decode=True)
-            if payload:
+            content_b64 = _attachment_b64(part)
+            if content_b64:
                 pdf_attachments.append(
                     {
                         "filename": part.get_filename() or "attachment.pdf",
                         "content_type": "application/pdf",
-                        "content_b64": base64.b64encode(payload).decode(),
+                        "content_b64": content_b64,
                     }
                 )
 
     return "\n".join(body_parts), pdf_attachments
 
 
-def build_source_blocks(files_b64: list[dict]) -> list[dict]:
+def _attachment_b64(part) -> str:
+    """Return a MIME part's content as one base64 string ("" if it's empty).
+
+    Attachments are almost always base64 on the wire already — only the MIME line
+    breaks need removing, which avoids decoding a multi-MB PDF to bytes just to
+    re-encode it. Other transfer encodings (or malformed base64) are decoded and
+    re-encoded as before.
+    """
+    if part.get("Content-Transfer-Encoding", "").strip().lower() == "base64":
+        content_b64 = "".join(part.get_payload(decode=False).split())
+        if len(content_b64) % 4 == 0:
+            return content_b64
+    payload = part.get_payload(decode=True)
+    return base64.b64encode(payload).decode() if payload else ""
+
+
+def _file_bytes(f: dict) -> bytes:
+    """Raw bytes of a pipeline file (raw "content", or decoded "content_b64")."""
+    if "content" in f:
+        return f["content"]
+    return base64.b64decode(f["content_b64"])
+
+
+def _file_b64(f: dict) -> str:
+    """Base64 of a pipeline file, encoded at most once.
+
+    The encoding is stored back on the dict, so send_results() attaches the same
+    string instead of encoding the PDF a second time.
+    """
+    if "content_b64" not in f:
+        f["content_b64"] = base64.b64encode(f["content"]).decode()
+    return f["content_b64"]
+
+
+def build_source_blocks(files: list[dict]) -> list[dict]:
     """Build the Anthropic content-block list from uploaded files.
 
     The same list is sent to Haiku (for the compact extract) and reused
@@ -108,7 +179,7 @@ def build_source_blocks(files_b64: list[dict]) -> list[dict]:
     """
     blocks: list[dict] = []
 
-    for f in files_b64:
+    for f in files:
         ct = f.get("content_type", "application/octet-stream")
         filename = f.get("filename", "")
 
@@ -119,14 +190,14 @@ def build_source_blocks(files_b64: list[dict]) -> list[dict]:
                     "source": {
                         "type": "base64",
                         "media_type": "application/pdf",
-                        "data": f["content_b64"],
+                        "data": _file_b64(f),
                     },
                     "title": filename or "invoice.pdf",
                 }
             )
 
         elif "rfc822" in ct.lower() or filename.lower().endswith(".eml"):
-            raw_bytes = base64.b64decode(f["content_b64"])
+            raw_bytes = _file_bytes(f)
             body_text, pdf_attachments = _parse_eml(raw_bytes)
 
             if body_text.strip():
@@ -151,23 +222,70 @@ def build_source_blocks(files_b64: list[dict]) -> list[dict]:
         ):
             import io
             import mammoth
-            raw_bytes = base64.b64decode(f["content_b64"])
+            raw_bytes = _file_bytes(f)
             result = mammoth.convert_to_markdown(io.BytesIO(raw_bytes))
             blocks.append({"type": "text", "text": result.value})
 
         else:
-            raw_bytes = base64.b64decode(f["content_b64"])
+            raw_bytes = _file_bytes(f)
             text = raw_bytes.decode("utf-8", errors="replace")
             blocks.append({"type": "text", "text": text})
 
     return blocks
 
 
-async def run(files_b64: list[dict]) -> dict:
+def build_request(source_blocks: list[dict]) -> dict:
+    """Build the Haiku extract request for build_source_blocks() output.
+
+    Returns a call_claude_batch()-style dict — the real-time run() sends the same
+    request, so batch and real-time extracts match.
+    """
+    # Haiku call gets the source blocks + a trailing instruction block.
+    haiku_content = list(source_blocks) + [
+        {
+            "type": "text",
+            "text": (
+                "Extract all invoice data fields from the attached document(s). "
+                "Output only LABEL: value lines. No prose, no headers, no extra text."
+            ),
+        }
+    ]
+    return {
+        "system_prompt": SYSTEM_PROMPT,
+        "user_content": haiku_content,
+        "max_tokens": 8192,
+        "model": HAIKU_MODEL,
+    }
+
+
+async def run_batch(file_batches: list[list[dict]]) -> list[dict | Exception]:
+    """Run Agent 1 for many invoices as one Message Batch.
+
+    Args:
+        file_batches: One files list (as run() takes) per invoice.
+
+    Returns:
+        One run()-style payload per invoice, in the same order, or the Exception
+        for an invoice whose request failed.
+    """
+    all_blocks = [build_source_blocks(files) for files in file_batches]
+    extracts = await call_claude_batch(
+        [build_request(source_blocks) for source_blocks in all_blocks],
+        parse=lambda message: message.content[0].text,
+    )
+    return [
+        extract if isinstance(extract, Exception)
+        else {"extract": extract, "source_blocks": source_blocks}
+        for extract, source_blocks in zip(extracts, all_blocks)
+    ]
+
+
+async def run(files: list[dict]) -> dict:
     """Convert one or more invoice files to a compact data extract + raw source.
 
     Args:
-        files_b64: List of dicts with keys: filename, content_type, content_b64
+        files: List of dicts with keys: filename, content_type, and either
+               content (raw bytes) or content_b64 (base64 string)
 
     Returns:
         {
@@ -176,30 +294,88 @@ async def run(files_b64: list[dict]) -> dict:
                            Markdown + email body text, ready to reuse downstream.
         }
     """
-    client = anthropic.AsyncAnthropic(max_retries=6)
+    source_blocks = build_source_blocks(files)
+    groups = await _split_oversized(source_blocks)
+    if len(groups) > 1:
+        print(f"[markdown_agent] input over {_MAX_INPUT_TOKENS} tokens — "
+              f"splitting {len(source_blocks)} blocks into {len(groups)} calls")
+    extracts = await asyncio.gather(*(_extract(build_request(g)) for g in groups))
 
-    source_blocks = build_source_blocks(files_b64)
+    return {
+        "extract": "\n".join(extracts),
+        "source_blocks": source_blocks,
+    }
 
-    # Haiku call gets the source blocks + a trailing instruction block.
-    haiku_content = list(source_blocks) + [
-        {
-            "type": "text",
-            "text": (
-                "Extract all invoice data fields from the attached document(s). "
-                "Output only LABEL: value lines. No prose, no headers, no extra text."
-            ),
-        }
-    ]
 
+def _block_chars(block: dict) -> int:
+    """Rough size of a content block: base64 data or text length."""
+    if block["type"] == "document":
+        return len(block["source"]["data"])
+    return len(block.get("text", ""))
+
+
+async def _count_tokens(blocks: list[dict]) -> int:
+    """Input tokens build_request(blocks) would send, via the token-counting API.
+
+    Counting only sizes the input, so it is not retried: if the call fails, a
+    character estimate (_CHARS_PER_TOKEN) is returned instead of failing Agent 1.
+    """
+    request = build_request(blocks)
+    try:
+        async with api_slots():
+            result = await anthropic_client().messages.count_tokens(
+                model=request["model"],
+                system=request["system_prompt"],
+                messages=[{"role": "user", "content": request["user_content"]}],
+            )
+    except (anthropic.APIError, httpx.TransportError) as e:
+        chars = len(request["system_prompt"]) + sum(map(_block_chars, blocks))
+        estimate = chars // _CHARS_PER_TOKEN
+        print(f"[markdown_agent] count_tokens failed ({type(e).__name__}), "
+              f"estimating {estimate} tokens from {chars} characters")
+        return estimate
+    return result.input_tokens
+
+
+async def _split_oversized(source_blocks: list[dict]) -> list[list[dict]]:
+    """Group source blocks so each group fits in one Haiku call.
+
+    Small uploads are returned as a single group without counting. Otherwise each
+    block is counted and blocks are packed greedily, in order, under
+    _MAX_INPUT_TOKENS. A single block over the budget still gets its own call.
+    """
+    if len(source_blocks) < 2 or sum(map(_block_chars, source_blocks)) < _COUNT_TOKENS_MIN_CHARS:
+        return [source_blocks]
+    if await _count_tokens(source_blocks) <= _MAX_INPUT_TOKENS:
+        return [source_blocks]
+
+    # Each per-block count includes the system prompt, so packing by the sum is
+    # conservative.
+    counts = await asyncio.gather(*(_count_tokens([b]) for b in source_blocks))
+    groups: list[list[dict]] = []
+    group_tokens = 0
+    for block, tokens in zip(source_blocks, counts):
+        if groups and group_tokens + tokens <= _MAX_INPUT_TOKENS:
+            groups[-1].append(block)
+            group_tokens += tokens
+        else:
+            groups.append([block])
+            group_tokens = tokens
+    return groups
+
+
+async def _extract(request: dict) -> str:
+    """Send one build_request() request and return Haiku's LABEL: value text."""
     app_retries = 8
     for attempt in range(app_retries + 1):
         try:
-            message = await client.messages.create(
-                model="claude-haiku-4-5-20251001",
-                max_tokens=8192,
-                system=SYSTEM_PROMPT,
-                messages=[{"role": "user", "content": haiku_content}],
-            )
+            async with api_slots():
+                message = await anthropic_client().messages.create(
+                    model=request["model"],
+                    max_tokens=request["max_tokens"],
+                    system=cached_system(request["system_prompt"]),
+                    messages=[{"role": "user", "content": request["user_content"]}],
+                )
             break
         except (anthropic.APIConnectionError, anthropic.APITimeoutError) as e:
             if attempt < app_retries:
@@ -218,7 +394,10 @@ async def run(files_b64: list[dict]) -> dict:
                 continue
             raise
 
-    return {
-        "extract": message.content[0].text,
-        "source_blocks": source_blocks,
-    }
+    usage = message.usage
+    print(f"[markdown_agent] tokens: input={usage.input_tokens} "
+          f"cache_read={usage.cache_read_input_tokens or 0} "
+          f"cache_write={usage.cache_creation_input_tokens or 0} "
+          f"output={usage.output_tokens}")
+
+    return message.content[0].text
@@ -8,12 +8,31 @@ Reads the invoice Markdown and classifies:
   - serviceFeeIncluded (true if form service_fee > 0)
 
 Returns a plain dict (parsed from the model's JSON output).
+
+run_batch() classifies many invoices in one Message Batch (50% token cost) — for
+bulk / overnight runs, not the upload form.
 """
 
 import asyncio
-import json
-import re
+import copy
+import hashlib
+from collections import OrderedDict
+
 import anthropic
+import orjson
+
+from app.agents.extractors.base import (
+    HAIKU_MODEL,
+    anthropic_client,
+    api_slots,
+    cached_system,
+    call_claude_batch,
+)
+
+# Classifications of recent invoices, keyed by a hash of the request (hints + extract).
+# A re-upload or pipeline retry on a warm container skips the Haiku call. LRU-bounded.
+_ROUTING_CACHE: OrderedDict[str, dict] = OrderedDict()
+_ROUTING_CACHE_SIZE = 256
 
 SYSTEM_PROMPT = """\
 You are a booking classifier for a travel agency using ClientBase Online software.
@@ -142,6 +161,39 @@ OUTPUT FORMAT (strict JSON — no prose, no fences)
 """
 
 
+def build_request(markdown: str, vendor_hint: str, booking_type_hint: str) -> dict:
+    """Build the classification request (call_claude_batch()-style dict) for run()."""
+    user_content = (
+        f'VENDOR HINT from form: "{vendor_hint}"\n'
+        f'BOOKING TYPE HINT from form: "{booking_type_hint}"\n\n'
+        f"INVOICE MARKDOWN:\n{markdown}\n\n"
+        "Return only the JSON classification object."
+    )
+    return {
+        "system_prompt": SYSTEM_PROMPT,
+        "user_content": user_content,
+        "max_tokens": 512,
+        "model": HAIKU_MODEL,
+    }
+
+
+async def run_batch(invoices: list[tuple[str, str, str]]) -> list[dict | Exception]:
+    """Classify many invoices as one Message Batch.
+
+    Args:
+        invoices: (markdown, vendor_hint, booking_type_hint) per invoice — the same
+                  arguments run() takes.
+
+    Returns:
+        One routing dict per invoice, in the same order, or the Exception for an
+        invoice whose request failed or didn't parse.
+    """
+    return await call_claude_batch(
+        [build_request(*invoice) for invoice in invoices],
+        parse=_parse_routing,
+    )
+
+
 async def run(markdown: str, vendor_hint: str, booking_type_hint: str) -> dict:
     """Classify vendor and booking types from invoice Markdown.
 
@@ -153,24 +205,22 @@ async def run(markdown: str, vendor_hint: str, booking_type_hint: str) -> dict:
     Returns:
         Dict with keys: vendor, ruleSet, bookingTypes, serviceFeeIncluded
     """
-    client = anthropic.AsyncAnthropic(max_retries=6)
-
-    user_content = (
-        f'VENDOR HINT from form: "{vendor_hint}"\n'
-        f'BOOKING TYPE HINT from form: "{booking_type_hint}"\n\n'
-        f"INVOICE MARKDOWN:\n{markdown}\n\n"
-        "Return only the JSON classification object."
-    )
+    request = build_request(markdown, vendor_hint, booking_type_hint)
+    key = hashlib.blake2b(request["user_content"].encode(), digest_size=16).hexdigest()
+    if key in _ROUTING_CACHE:
+        _ROUTING_CACHE.move_to_end(key)
+        return copy.deepcopy(_ROUTING_CACHE[key])
 
     app_retries = 8
     for attempt in range(app_retries + 1):
         try:
-            message = await client.messages.create(
-                model="claude-haiku-4-5-20251001",
-                max_tokens=512,
-                system=SYSTEM_PROMPT,
-                messages=[{"role": "user", "content": user_content}],
-            )
+            async with api_slots():
+                message = await anthropic_client().messages.create(
+                    model=request["model"],
+                    max_tokens=request["max_tokens"],
+                    system=cached_system(request["system_prompt"]),
+                    messages=[{"role": "user", "content": request["user_content"]}],
+                )
             break
         except (anthropic.APIConnectionError, anthropic.APITimeoutError) as e:
             if attempt < app_retries:
@@ -189,11 +239,26 @@ async def run(markdown: str, vendor_hint: str, booking_type_hint: str) -> dict:
                 continue
             raise
 
+    usage = message.usage
+    print(f"[routing_agent] tokens: input={usage.input_tokens} "
+          f"cache_read={usage.cache_read_input_tokens or 0} "
+          f"cache_write={usage.cache_creation_input_tokens or 0} "
+          f"output={usage.output_tokens}")
+
+    routing = _parse_routing(message)
+    _ROUTING_CACHE[key] = copy.deepcopy(routing)
+    if len(_ROUTING_CACHE) > _ROUTING_CACHE_SIZE:
+        _ROUTING_CACHE.popitem(last=False)
+    return routing
+
+
+def _parse_routing(message) -> dict:
+    """Parse the classification JSON object out of a routing response message."""
     raw = message.content[0].text.strip()
 
-    # Strip accidental code fences
-    raw = re.sub(r"^```(?:json)?\s*", "", raw)
-    raw = re.sub(r"\s*```\s*$", "", raw)
-    raw = raw.strip()
+    # Strip accidental code fences (rare — the prompt asks for none)
+    if raw.startswith("```"):
+        raw = raw.removeprefix("```").removeprefix("json")
+    raw = raw.removesuffix("```").strip()
 
-    return json.loads(raw)
+    return orjson.loads(raw)
@@ -4,16 +4,21 @@ Email delivery via Resend API.
 send_results() — formats the extracted invoice sections as an HTML email
                  and POSTs to https://api.resend.com/emails
 
-Uses httpx (already a project dependency) — no Resend SDK needed.
+Uses httpx (already a project dependency) through the shared pooled client in
+app/http_client.py — no Resend SDK needed.
 Reads RESEND_API_KEY, FROM_EMAIL, TO_EMAIL from environment (Modal secrets).
 """
 
+import base64
 import html
-import json
 import os
-from datetime import datetime
+import time
+from collections import Counter
+from string import Template
 
-import httpx
+import orjson
+
+from app.http_client import get_client
 
 RESEND_URL = "https://api.resend.com/emails"
 
@@ -30,6 +35,45 @@ _TD_VALUE = (
 )
 _TABLE_STYLE = 'style="border-collapse:collapse;width:100%;margin-bottom:8px"'
 
+# Fixed markup around every section, built once instead of per section.
+_ITEM_LABEL_OPEN = '<p style="margin:8px 0 2px;font-size:0.8em;color:#6b7280">'
+_TEXT_PRE_OPEN = (
+    '<pre style="background:#f9fafb;padding:12px;border-radius:4px;'
+    'font-size:0.85em;white-space:pre-wrap;border:1px solid #e5e7eb">'
+)
+_JSON_BLOCK_OPEN = (
+    '<div style="margin-top:10px">'
+    '<p style="margin:0 0 4px;font-size:0.75em;font-weight:600;color:#6b7280;'
+    'text-transform:uppercase;letter-spacing:0.05em">Raw JSON — copy for UI.Vision</p>'
+    '<pre style="margin:0;background:#1e293b;color:#e2e8f0;padding:12px;'
+    'border-radius:6px;font-size:0.8em;overflow-x:auto;'
+    'white-space:pre;word-break:normal">'
+)
+_SECTION_OPEN = '<div style="margin-bottom:36px">'
+_TITLE_OPEN = (
+    '<h3 style="margin:0 0 8px;font-size:1rem;color:#1d4ed8;'
+    'border-bottom:2px solid #dbeafe;padding-bottom:6px">'
+)
+
+# Outer email shell. Every placeholder is filled by _build_html(), which escapes
+# each value at the substitution site; only ${body} is pre-rendered HTML.
+_SHELL = Template("""<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"></head>
+<body style="font-family:system-ui,sans-serif;max-width:700px;margin:0 auto;padding:24px;color:#111827">
+  <div style="border-bottom:3px solid #2563eb;padding-bottom:16px;margin-bottom:24px">
+    <h1 style="margin:0;font-size:1.4rem;color:#1e3a8a">${traveller}</h1>
+    <p style="margin:4px 0 0;color:#6b7280;font-size:0.9em">
+      ${vendor} &nbsp;·&nbsp; ${types} &nbsp;·&nbsp; ${ts}
+    </p>
+  </div>
+  ${body}
+  <p style="margin-top:32px;font-size:0.75em;color:#9ca3af;border-top:1px solid #e5e7eb;padding-top:12px">
+    Sent by Invoice Automation Pipeline
+  </p>
+</body>
+</html>""")
+
 
 def _kv_table(d: dict) -> str:
     """Render a dict as a two-column key/value HTML table."""
@@ -53,42 +97,25 @@ def _section_html(section: dict, display_title: str | None = None) -> str:
         parts = []
         for i, item in enumerate(data, 1):
             if isinstance(item, dict):
-                label = (
-                    f'<p style="margin:8px 0 2px;font-size:0.8em;color:#6b7280">'
-                    f"#{i}</p>"
-                )
-                parts.append(label + _kv_table(item))
+                parts.append(f"{_ITEM_LABEL_OPEN}#{i}</p>{_kv_table(item)}")
             else:
                 parts.append(f"<p>{html.escape(str(item))}</p>")
         content = "".join(parts) or "<em>Empty</em>"
 
     elif isinstance(data, str):
-        content = (
-            f'<pre style="background:#f9fafb;padding:12px;border-radius:4px;'
-            f'font-size:0.85em;white-space:pre-wrap;border:1px solid #e5e7eb">'
-            f"{html.escape(data)}</pre>"
-        )
+        content = f"{_TEXT_PRE_OPEN}{html.escape(data)}</pre>"
 
     else:
         content = f"<p>{html.escape(str(data))}</p>"
 
-    raw_json = html.escape(json.dumps(data, indent=2, ensure_ascii=False))
-    json_block = (
-        f'<div style="margin-top:10px">'
-        f'<p style="margin:0 0 4px;font-size:0.75em;font-weight:600;color:#6b7280;'
-        f'text-transform:uppercase;letter-spacing:0.05em">Raw JSON — copy for UI.Vision</p>'
-        f'<pre style="margin:0;background:#1e293b;color:#e2e8f0;padding:12px;'
-        f'border-radius:6px;font-size:0.8em;overflow-x:auto;'
-        f'white-space:pre;word-break:normal">{raw_json}</pre>'
-        f'</div>'
+    raw_json = html.escape(
+        orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
     )
 
     return (
-        f'<div style="margin-bottom:36px">'
-        f'<h3 style="margin:0 0 8px;font-size:1rem;color:#1d4ed8;'
-        f'border-bottom:2px solid #dbeafe;padding-bottom:6px">{title}</h3>'
+        f"{_SECTION_OPEN}{_TITLE_OPEN}{title}</h3>"
         f"{content}"
-        f"{json_block}"
+        f"{_JSON_BLOCK_OPEN}{raw_json}</pre></div>"
         f"</div>"
     )
 
@@ -96,15 +123,17 @@ def _section_html(section: dict, display_title: str | None = None) -> str:
 def _build_html(
     traveller_name: str,
     vendor: str,
-    booking_types: list[str],
+    types_str: str,
+    timestamp: str,
     sections: list[dict],
     status: str,
     error: str | None,
 ) -> str:
-    """Build the full HTML email body."""
-    types_str = " + ".join(t.replace("_", " ").title() for t in booking_types) if booking_types else "Unknown"
-    timestamp = datetime.now().strftime("%b %d, %Y at %I:%M %p")
+    """Build the full HTML email body.
 
+    types_str and timestamp are computed once by send_results(), which also
+    uses types_str in the subject line.
+    """
     if status == "error":
         body = (
             f'<div style="background:#fef2f2;border:1px solid #fecaca;border-radius:6px;padding:16px;margin-bottom:24px">'
@@ -117,7 +146,6 @@ def _build_html(
         # e.g. two "Rail Screen 2 (Details)" become "Rail Screen 2 (Details) — 1 of 2"
         #      and "Rail Screen 2 (Details) — 2 of 2".
         # The raw JSON blocks are unaffected — CBO copy-paste still works.
-        from collections import Counter
         title_counts = Counter(s.get("sectionTitle", "Section") for s in sections)
         title_seen: dict[str, int] = {}
         display_titles = []
@@ -130,22 +158,13 @@ def _build_html(
                 display_titles.append(t)
         body = "".join(_section_html(s, dt) for s, dt in zip(sections, display_titles))
 
-    return f"""<!DOCTYPE html>
-<html>
-<head><meta charset="utf-8"></head>
-<body style="font-family:system-ui,sans-serif;max-width:700px;margin:0 auto;padding:24px;color:#111827">
-  <div style="border-bottom:3px solid #2563eb;padding-bottom:16px;margin-bottom:24px">
-    <h1 style="margin:0;font-size:1.4rem;color:#1e3a8a">{html.escape(traveller_name)}</h1>
-    <p style="margin:4px 0 0;color:#6b7280;font-size:0.9em">
-      {html.escape(vendor)} &nbsp;·&nbsp; {html.escape(types_str)} &nbsp;·&nbsp; {timestamp}
-    </p>
-  </div>
-  {body}
-  <p style="margin-top:32px;font-size:0.75em;color:#9ca3af;border-top:1px solid #e5e7eb;padding-top:12px">
-    Sent by Invoice Automation Pipeline
-  </p>
-</body>
-</html>"""
+    return _SHELL.substitute(
+        traveller=html.escape(traveller_name),
+        vendor=html.escape(vendor),
+        types=html.escape(types_str),
+        ts=html.escape(timestamp),
+        body=body,
+    )
 
 
 # ── Public API ─────────────────────────────────────────────────────────────────
@@ -168,8 +187,9 @@ async def send_results(
         sections:       Flat list of section dicts from run_all().
         status:         "success" or "error".
         error:          Error message string if status == "error".
-        attachments:    Original invoice files as list of
-                        {"filename": str, "content_type": str, "content_b64": str}.
+        attachments:    Original invoice files as list of {"filename": str,
+                        "content_type": str} dicts carrying either "content_b64"
+                        (str) or raw "content" (bytes).
 
     Raises:
         httpx.HTTPStatusError: If Resend returns a non-2xx response.
@@ -180,11 +200,13 @@ async def send_results(
 
     types_str = " + ".join(t.replace("_", " ").title() for t in booking_types) if booking_types else "Unknown"
     subject = f"Invoice: {traveller_name} — {vendor} ({types_str})"
+    timestamp = time.strftime("%b %d, %Y at %I:%M %p")
 
     email_html = _build_html(
         traveller_name=traveller_name,
         vendor=vendor,
-        booking_types=booking_types,
+        types_str=types_str,
+        timestamp=timestamp,
         sections=sections,
         status=status,
         error=error,
@@ -199,14 +221,22 @@ async def send_results(
 
     if attachments:
         payload["attachments"] = [
-            {"filename": f["filename"], "content": f["content_b64"]}
+            {
+                "filename": f["filename"],
+                # Agent 1 already stored content_b64 on PDFs; only the rest encode here.
+                "content": f.get("content_b64") or base64.b64encode(f["content"]).decode(),
+            }
             for f in attachments
         ]
 
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        resp = await client.post(
-            RESEND_URL,
-            headers={"Authorization": f"Bearer {api_key}"},
-            json=payload,
-        )
-        resp.raise_for_status()
+    resp = await get_client().post(
+        RESEND_URL,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        },
+        # Serialized once with orjson — the payload carries the base64 attachments.
+        content=orjson.dumps(payload),
+        timeout=15.0,
+    )
+    resp.raise_for_status()
@@ -0,0 +1,34 @@
+"""
+Shared outbound HTTP client.
+
+get_client() — the pooled httpx.AsyncClient for the running event loop
+
+Used for every plain HTTP call the pipeline makes (Resend emails, the n8n
+callback), so back-to-back requests on a warm container reuse keep-alive
+connections instead of paying a TLS handshake each time. Callers pass their own
+timeout and headers per request; the client itself carries neither.
+
+The client is never closed explicitly: it lives as long as the container, whose
+shutdown drops the idle keep-alive sockets.
+"""
+
+import asyncio
+
+import httpx
+
+_CLIENT: httpx.AsyncClient | None = None
+_CLIENT_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it for the running event loop.
+
+    A client is bound to the loop it was first used on, so a new loop (e.g. a
+    fresh asyncio.run()) gets its own client rather than a dead pool.
+    """
+    global _CLIENT, _CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if _CLIENT is None or _CLIENT.is_closed or _CLIENT_LOOP is not loop:
+        _CLIENT = httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=10))
+        _CLIENT_LOOP = loop
+    return _CLIENT
@@ -8,17 +8,27 @@ Flow:
 Processing is async: the endpoint returns 202 immediately; the pipeline runs in
 a Modal background function and emails results when done.
 
+Bulk runs (POST /process-invoice-batch) go through run_pipeline_batch: each agent
+step sends all of the invoices as one Message Batch — half the token cost, but
+results take minutes (up to a day) instead of seconds.
+
 n8n backward-compat: if callback_url is supplied (via /process-invoice-json),
 the pipeline also POSTs the JSON payload to that URL.
 """
 
+import asyncio
 import base64
+import gzip
 import io
+import os
+import re
 import zipfile
 
 import modal
+import orjson
 from fastapi import FastAPI, File, Form, Request, UploadFile
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
+from fastapi.concurrency import run_in_threadpool
 
 # ── Modal app setup ────────────────────────────────────────────────────────────
 
@@ -30,7 +40,8 @@ image = (
         "fastapi>=0.104.0",
         "anthropic>=0.40.0",
         "httpx>=0.27.0",
-        "python-multipart>=0.0.9",
+        "orjson>=3.9.0",
+        "python-multipart>=0.0.12",  # 0.0.12+ parses large file parts much faster
         "mammoth>=1.8.0",
     )
     .add_local_python_source("app")
@@ -230,43 +241,102 @@ _FORM_HTML = """\
 </html>
 """
 
+# The form is static: encode (and gzip) it once at import rather than per request.
+_FORM_HTML_BYTES = _FORM_HTML.encode("utf-8")
+_FORM_HTML_GZ = gzip.compress(_FORM_HTML_BYTES, compresslevel=9)
+_FORM_HEADERS = {"vary": "accept-encoding", "cache-control": "public, max-age=3600"}
+_FORM_GZ_HEADERS = {**_FORM_HEADERS, "content-encoding": "gzip"}
+
+
+def _form_encoding(accept_encoding: str) -> str | None:
+    """Pick "gzip" or "identity" for the form from an Accept-Encoding header.
+
+    The header is a comma-separated list of codings with optional ;q= weights;
+    codings are compared as exact tokens (x-gzip is gzip's alias), and q=0 refuses
+    one. Identity is acceptable unless refused by "identity;q=0" or "*;q=0".
+    Returns None if the client refuses both.
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights["gzip" if coding == "x-gzip" else coding] = q
+
+    wildcard = weights.get("*")
+    if weights.get("gzip", wildcard or 0.0) > 0:
+        return "gzip"
+    if weights.get("identity", 1.0 if wildcard is None else wildcard) > 0:
+        return "identity"
+    return None
+
 # ── Zip expansion helper ───────────────────────────────────────────────────────
 
+# Invoice file types accepted inside a zip, by lowercased extension.
+_ZIP_CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".eml": "message/rfc822",
+    ".md": "text/markdown",
+    ".txt": "text/plain",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+# Zip MIME types (browsers, mail clients and curl vary), matched after stripping
+# any ";" parameters and lowercasing once.
+_ZIP_TYPES = frozenset({
+    "application/zip",
+    "application/x-zip",
+    "application/x-zip-compressed",
+    "application/zip-compressed",
+    "multipart/x-zip",
+})
+
+
+def _is_zip(filename: str, content_type: str) -> bool:
+    """True if an upload is a zip archive, by content type or extension."""
+    return (
+        content_type.partition(";")[0].strip().lower() in _ZIP_TYPES
+        or filename[-4:].lower() == ".zip"
+    )
+
+
 def _expand_upload(filename: str, content_type: str, raw: bytes) -> list[dict]:
     """Return a list of file dicts for the pipeline.
 
+    Entries carry the raw bytes ({"filename", "content_type", "content"}) — Modal
+    pickles bytes natively, so nothing is base64-encoded just to cross the spawn.
     Zip files are transparently unpacked — each inner PDF, .eml, or .md is
     returned as its own entry. Non-zip files are returned as-is in a 1-item list.
     macOS metadata entries (__MACOSX/, .DS_Store) are silently skipped.
     """
-    is_zip = filename.lower().endswith(".zip") or "zip" in content_type.lower()
-    if is_zip:
+    if _is_zip(filename, content_type):
         results = []
         try:
             with zipfile.ZipFile(io.BytesIO(raw)) as zf:
-                for member in zf.namelist():
+                for info in zf.infolist():
                     # Skip directories, macOS metadata, and hidden files
-                    if member.endswith("/") or "__MACOSX" in member or member.split("/")[-1].startswith("."):
+                    if info.is_dir() or "__MACOSX" in info.filename:
+                        continue
+                    basename = info.filename.rsplit("/", 1)[-1]
+                    if basename.startswith("."):
                         continue
-                    lower = member.lower()
-                    if lower.endswith(".pdf"):
-                        ct = "application/pdf"
-                    elif lower.endswith(".eml"):
-                        ct = "message/rfc822"
-                    elif lower.endswith(".md"):
-                        ct = "text/markdown"
-                    elif lower.endswith(".txt"):
-                        ct = "text/plain"
-                    elif lower.endswith(".docx"):
-                        ct = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                    else:
+                    ct = _ZIP_CONTENT_TYPES.get(os.path.splitext(basename)[1].lower())
+                    if ct is None:
                         continue  # ignore non-invoice files inside the zip
-                    member_bytes = zf.read(member)
-                    basename = member.split("/")[-1]
                     results.append({
                         "filename": basename,
                         "content_type": ct,
-                        "content_b64": base64.b64encode(member_bytes).decode(),
+                        "content": zf.read(info),
                     })
         except zipfile.BadZipFile:
             pass  # fall through — treat as a regular file
@@ -277,10 +347,42 @@ def _expand_upload(filename: str, content_type: str, raw: bytes) -> list[dict]:
     return [{
         "filename": filename,
         "content_type": content_type,
-        "content_b64": base64.b64encode(raw).decode(),
+        "content": raw,
     }]
 
 
+def _expand_json_files(items: list[dict]) -> list[dict]:
+    """Unpack zips in a JSON-endpoint file list; other entries pass through as-is.
+
+    Only zips are base64-decoded here. Everything else keeps its content_b64 —
+    the worker decodes just the files it parses (.eml / .docx / text), and PDFs
+    go to Claude and Resend still encoded.
+    """
+    files = []
+    for item in items:
+        filename = item.get("filename", "attachment")
+        content_type = item.get("content_type", "application/octet-stream")
+        if _is_zip(filename, content_type):
+            raw = base64.b64decode(item["content_b64"])
+            files.extend(_expand_upload(filename, content_type, raw))
+        else:
+            files.append(item)
+    return files
+
+
+def _group_invoices(files: list[dict]) -> list[list[dict]]:
+    """Group pipeline files into invoices by file name without extension.
+
+    "booking.eml" and "booking.pdf" become one invoice; every other name is its
+    own. Groups keep the order their first file appeared in.
+    """
+    groups: dict[str, list[dict]] = {}
+    for f in files:
+        stem = os.path.splitext(f["filename"])[0].lower()
+        groups.setdefault(stem, []).append(f)
+    return list(groups.values())
+
+
 # ── FastAPI app (runs inside Modal ASGI container) ─────────────────────────────
 
 web_app = FastAPI(title="Invoice Processor", version="2.0.0")
@@ -292,9 +394,15 @@ async def health():
 
 
 @web_app.get("/form", response_class=HTMLResponse)
-async def form():
-    """Serve the invoice upload form."""
-    return _FORM_HTML
+async def form(request: Request):
+    """Serve the invoice upload form (gzipped when the client accepts it)."""
+    encoding = _form_encoding(request.headers.get("accept-encoding", ""))
+    if encoding == "gzip":
+        return Response(_FORM_HTML_GZ, media_type="text/html", headers=_FORM_GZ_HEADERS)
+    if encoding == "identity":
+        return Response(_FORM_HTML_BYTES, media_type="text/html", headers=_FORM_HEADERS)
+    # Neither coding this endpoint can produce is acceptable to the client.
+    return Response(status_code=406, headers=_FORM_HEADERS)
 
 
 @web_app.post("/process-invoice", status_code=202)
@@ -303,6 +411,7 @@ async def receive_invoice(
     callback_url: str = Form(""),
     service_fee: float = Form(0.0),
     booking_type_hint: str = Form(""),
+    split_invoices: bool = Form(False),
     files: list[UploadFile] = File(...),
 ):
     """
@@ -314,28 +423,38 @@ async def receive_invoice(
       callback_url      – optional: if set, results are also POSTed here (n8n compat)
       service_fee       – agency service fee amount (0 if none)
       booking_type_hint – optional hint (flight / tour / hotel / etc.)
+      split_invoices    – optional: treat the files as separate invoices and run one
+                          pipeline per invoice (files sharing a name, e.g. a.eml +
+                          a.pdf, stay together). The service fee goes on the first only.
       files             – one or more PDF, .eml, or .md invoice attachments
     """
-    files_b64 = []
-    for f in files:
-        raw = await f.read()
-        files_b64.extend(
-            _expand_upload(
+    # Large parts are spooled to disk by the form parser — read them concurrently,
+    # and unzip off the event loop so other requests keep moving meanwhile.
+    raws = await asyncio.gather(*(f.read() for f in files))
+    pipeline_files = []
+    for f, raw in zip(files, raws):
+        pipeline_files.extend(
+            await run_in_threadpool(
+                _expand_upload,
                 f.filename or "attachment",
                 f.content_type or "application/octet-stream",
                 raw,
             )
         )
 
-    run_pipeline.spawn(
-        vendor=vendor,
-        callback_url=callback_url,
-        service_fee=service_fee,
-        booking_type_hint=booking_type_hint,
-        files_b64=files_b64,
-    )
+    # Independent invoices fan out across Modal containers instead of being
+    # extracted as one combined document.
+    jobs = _group_invoices(pipeline_files) if split_invoices else [pipeline_files]
+    for i, job_files in enumerate(jobs):
+        run_pipeline.spawn(
+            vendor=vendor,
+            callback_url=callback_url,
+            service_fee=service_fee if i == 0 else 0.0,
+            booking_type_hint=booking_type_hint,
+            files=job_files,
+        )
 
-    return {"status": "accepted", "files_received": len(files_b64)}
+    return {"status": "accepted", "files_received": len(pipeline_files), "jobs": len(jobs)}
 
 
 @web_app.post("/process-invoice-json", status_code=202)
@@ -343,6 +462,7 @@ async def receive_invoice_json(request: Request):
     """
     Accept invoice data as JSON with base64-encoded files.
     Kept for backward compatibility with n8n and direct API calls.
+    Zip files are unpacked the same way as on the form endpoint.
 
     JSON body:
       {
@@ -356,21 +476,85 @@ async def receive_invoice_json(request: Request):
         ]
       }
     """
-    body = await request.json()
+    # orjson: the body is mostly multi-MB base64 strings.
+    body = orjson.loads(await request.body())
+    files = await run_in_threadpool(_expand_json_files, body.get("files", []))
 
     run_pipeline.spawn(
         vendor=body.get("vendor", ""),
         callback_url=body.get("callback_url", ""),
         service_fee=float(body.get("service_fee", 0.0)),
         booking_type_hint=body.get("booking_type_hint", ""),
-        files_b64=body.get("files", []),
+        files=files,
     )
 
-    return {"status": "accepted", "files_received": len(body.get("files", []))}
+    return {"status": "accepted", "files_received": len(files)}
+
+
+@web_app.post("/process-invoice-batch", status_code=202)
+async def receive_invoice_batch(request: Request):
+    """
+    Accept many invoices at once for a non-interactive bulk run (e.g. a backlog
+    folder). Each invoice is emailed (and called back) on its own, like a
+    /process-invoice-json run, once the shared Message Batch has ended.
+
+    The response carries the run's call_id: poll GET /process-invoice-batch/{call_id}
+    for its state and, once finished, one {"vendor", "status", "error"} entry per
+    invoice in request order.
+
+    JSON body:
+      {
+        "invoices": [
+          {same fields as the /process-invoice-json body},
+          ...
+        ]
+      }
+    """
+    body = orjson.loads(await request.body())
+    invoices = []
+    for item in body.get("invoices", []):
+        invoices.append({
+            "vendor": item.get("vendor", ""),
+            "callback_url": item.get("callback_url", ""),
+            "service_fee": float(item.get("service_fee", 0.0)),
+            "booking_type_hint": item.get("booking_type_hint", ""),
+            "files": await run_in_threadpool(_expand_json_files, item.get("files", [])),
+        })
+
+    call = run_pipeline_batch.spawn(invoices=invoices)
+
+    return {
+        "status": "accepted",
+        "call_id": call.object_id,
+        "invoices": len(invoices),
+        "files_received": sum(len(invoice["files"]) for invoice in invoices),
+    }
+
+
+@web_app.get("/process-invoice-batch/{call_id}")
+async def invoice_batch_status(call_id: str):
+    """
+    State of a bulk run started by POST /process-invoice-batch:
+      {"status": "running"}                          — batches still in progress
+      {"status": "done", "invoices": [...]}          — run_pipeline_batch's summary
+      {"status": "failed", "error": "..."}           — the run itself crashed / was killed
+    """
+    call = modal.FunctionCall.from_id(call_id)
+    try:
+        invoices = call.get(timeout=0)
+    except TimeoutError:
+        return {"call_id": call_id, "status": "running"}
+    except Exception as exc:
+        return {"call_id": call_id, "status": "failed", "error": str(exc)}
+    return {"call_id": call_id, "status": "done", "invoices": invoices}
 
 
 # ── Traveller name extraction ──────────────────────────────────────────────────
 
+# First "Passenger:" line of the Agent 1 extract.
+_PASSENGER_RE = re.compile(r"(?im)^Passenger:\s*(.+)$")
+
+
 def _extract_traveller_name(sections: list[dict], markdown: str = "") -> str:
     """Extract the first usable traveller name for the email subject line.
 
@@ -384,62 +568,60 @@ def _extract_traveller_name(sections: list[dict], markdown: str = "") -> str:
     The name is ONLY used for the email subject — it is never injected into
     the CBO section schemas, so UI.Vision macro output is unaffected.
     """
-    import re
-
     # 1. Parse markdown from Agent 1 — most reliable source across all booking types.
-    #    Matches lines like: "Passenger: John Smith", "Passengers: John Smith, Jane Smith",
-    #    "Traveller: ...", "Guest: ..." produced by the markdown agent.
+    #    Matches lines like: "Passenger: John Smith" produced by the markdown agent.
     if markdown:
-        match = re.search(
-            r"(?im)^Passenger:\s*(.+)$",
-            markdown,
-        )
+        match = _PASSENGER_RE.search(markdown)
         if match:
             first = match.group(1).strip()
             if first:
                 return first
 
-    # 2. Flight: Section 3 (Passengers) data is an array of passenger objects
+    # 2–4 in one pass over the sections; the flight hit wins outright, the other two
+    # are kept until the scan ends.
+    contact_name = any_name = ""
     for section in sections:
         title = section.get("sectionTitle", "")
         data = section.get("data")
 
+        # 2. Flight: Section 3 (Passengers) data is an array of passenger objects
         if "Passengers" in title and isinstance(data, list) and data:
             name = data[0].get("passengerName", "")
             if name:
                 return name
 
-    # 3. New Traveller Profile: Section 1 (Contact) has firstName + lastName
-    for section in sections:
-        title = section.get("sectionTitle", "")
-        data = section.get("data")
-
-        if "Contact" in title and isinstance(data, dict):
-            first = data.get("firstName", "")
-            last = data.get("lastName", "")
-            if first or last:
-                return f"{first} {last}".strip()
-
-    # 4. Fallback: any dict section with a passengerName key
-    for section in sections:
-        data = section.get("data")
         if isinstance(data, dict):
-            name = data.get("passengerName", "")
-            if name:
-                return name
+            # 3. New Traveller Profile: Section 1 (Contact) has firstName + lastName
+            if not contact_name and "Contact" in title:
+                first = data.get("firstName", "")
+                last = data.get("lastName", "")
+                contact_name = f"{first} {last}".strip() if first or last else ""
+            # 4. Fallback: any dict section with a passengerName key
+            if not any_name:
+                any_name = data.get("passengerName", "")
 
-    return "Unknown"
+    return contact_name or any_name or "Unknown"
 
 
 # ── Background pipeline function ───────────────────────────────────────────────
 
-@app.function(image=image, secrets=[ANTHROPIC_SECRET, RESEND_SECRET], timeout=300)
+# Cap on pipelines running at once. Modal runs one input per container, so extra
+# spawns wait in Modal's own queue instead of all hitting Anthropic together.
+_MAX_PIPELINES = 8
+
+
+@app.function(
+    image=image,
+    secrets=[ANTHROPIC_SECRET, RESEND_SECRET],
+    timeout=300,
+    max_containers=_MAX_PIPELINES,
+)
 async def run_pipeline(
     vendor: str,
     callback_url: str,
     service_fee: float,
     booking_type_hint: str,
-    files_b64: list[dict],
+    files: list[dict],
 ):
     """
     Full agent pipeline running inside a Modal worker:
@@ -449,13 +631,9 @@ async def run_pipeline(
       4. Email results        — formatted HTML email via Resend
       5. Callback POST        — if callback_url is set (n8n backward compat)
     """
-    import asyncio
-    import httpx
-
     from app.agents.markdown_agent import run as markdown_run
     from app.agents.routing_agent import run as routing_run
     from app.agents.extractors import run_all
-    from app.email_sender import send_results
 
     routing: dict = {}
     sections: list[dict] = []
@@ -465,17 +643,15 @@ async def run_pipeline(
 
     try:
         # Step 1: Convert all files to a {extract, source_blocks} payload
-        payload = await markdown_run(files_b64)
+        payload = await markdown_run(files)
         markdown = payload.get("extract", "")
 
-        # Agents 1 & 2 use haiku; Agent 3+ use sonnet — separate rate limit pools.
-        await asyncio.sleep(5)
+        # No fixed pauses between agents: every Claude call is admitted through
+        # base.api_slots() (ANTHROPIC_CONCURRENCY), and the SDK backs off on 429s.
 
         # Step 2: Classify vendor and detect booking type(s)
         routing = await routing_run(markdown, vendor, booking_type_hint)
 
-        await asyncio.sleep(5)
-
         # Step 3: Run all required extractors in parallel. Tour / cruise extractors
         # re-read the raw source_blocks from the payload to build the day-by-day
         # itinerary block; every other extractor uses the compact extract only.
@@ -485,7 +661,146 @@ async def run_pipeline(
         status = "error"
         error = str(exc)
 
-    # Step 4: Email results (always runs, even on error)
+    # Steps 4–5 always run, even on error.
+    await _deliver(vendor, callback_url, files, routing, sections, markdown, status, error)
+
+
+# A Message Batch can take up to 24h to end, and a bulk run chains three of them.
+# Modal kills the function at _BATCH_TIMEOUT, so the batch steps get a deadline that
+# leaves _BATCH_DELIVERY_MARGIN to email / call back every invoice either way.
+_BATCH_TIMEOUT = 24 * 60 * 60
+_BATCH_DELIVERY_MARGIN = 30 * 60
+
+
+@app.function(
+    image=image,
+    secrets=[ANTHROPIC_SECRET, RESEND_SECRET],
+    timeout=_BATCH_TIMEOUT,
+)
+async def run_pipeline_batch(invoices: list[dict]) -> list[dict]:
+    """
+    Bulk variant of run_pipeline for many invoices — each agent step is ONE
+    Message Batch covering every invoice still in the run:
+      1.   Markdown Specialist — markdown_agent.run_batch()
+      2.   Routing Specialist  — routing_agent.run_batch()
+      3.   Schema Extractors   — run_all_batch()
+      4–5. Email + callback    — per invoice, as in run_pipeline
+
+    Steps 1–3 share one deadline; invoices still unfinished when it passes are
+    delivered as errors (the pending batch is cancelled).
+
+    Args:
+        invoices: One dict per invoice holding run_pipeline()'s arguments
+                  (vendor, callback_url, service_fee, booking_type_hint, files).
+
+    Returns:
+        {"vendor", "status", "error"} per invoice, in the same order.
+    """
+    from app.agents.markdown_agent import run_batch as markdown_run_batch
+    from app.agents.routing_agent import run_batch as routing_run_batch
+    from app.agents.extractors import run_all_batch
+
+    payloads: list[dict] = [{} for _ in invoices]
+    routings: list[dict] = [{} for _ in invoices]
+    outcomes: dict[int, list[dict] | Exception] = {}  # sections, or why the invoice failed
+
+    async def submit(run_batch, ready: list[int], items: list) -> list:
+        """Run one step's batch for the ready invoices, recording any that fail.
+
+        If the whole submission fails, every item gets the error.
+        """
+        if not items:
+            return []
+        try:
+            results = await run_batch(items)
+        except Exception as exc:
+            results = [exc] * len(items)
+        for i, result in zip(ready, results):
+            if isinstance(result, Exception):
+                outcomes[i] = result
+        return results
+
+    async def run_steps():
+        # Steps 1–2: an invoice whose request fails is reported on its own and left
+        # out of the later batches.
+        ready = list(range(len(invoices)))
+        results = await submit(markdown_run_batch, ready, [inv["files"] for inv in invoices])
+        for i, payload in zip(ready, results):
+            if i not in outcomes:
+                payloads[i] = payload
+
+        ready = [i for i in ready if i not in outcomes]
+        results = await submit(routing_run_batch, ready, [
+            (payloads[i]["extract"], invoices[i]["vendor"], invoices[i]["booking_type_hint"])
+            for i in ready
+        ])
+        for i, routing in zip(ready, results):
+            if i not in outcomes:
+                routings[i] = routing
+
+        # Step 3: one Message Batch for all extractor calls of every ready invoice.
+        ready = [i for i in ready if i not in outcomes]
+        results = await submit(run_all_batch, ready, [
+            (payloads[i], routings[i], invoices[i]["service_fee"]) for i in ready
+        ])
+        outcomes.update(zip(ready, results))
+
+    deadline = _BATCH_TIMEOUT - _BATCH_DELIVERY_MARGIN
+    try:
+        async with asyncio.timeout(deadline):
+            await run_steps()
+    except TimeoutError:
+        print(f"[run_pipeline_batch] batches unfinished after {deadline}s — "
+              f"reporting {len(invoices) - len(outcomes)} invoice(s) as failed")
+        timed_out = TimeoutError(f"Message Batch did not finish within {deadline // 3600}h")
+        for i in range(len(invoices)):
+            outcomes.setdefault(i, timed_out)
+
+    # Steps 4–5, per invoice. One failed email or callback must not hold back the rest.
+    summary = []
+    deliveries = []
+    for i, invoice in enumerate(invoices):
+        outcome = outcomes[i]
+        failed = isinstance(outcome, Exception)
+        summary.append({
+            "vendor": routings[i].get("vendor", invoice["vendor"]),
+            "status": "error" if failed else "success",
+            "error": str(outcome) if failed else None,
+        })
+        deliveries.append(
+            _deliver(
+                invoice["vendor"],
+                invoice["callback_url"],
+                invoice["files"],
+                routings[i],
+                [] if failed else outcome,
+                payloads[i].get("extract", ""),
+                summary[-1]["status"],
+                summary[-1]["error"],
+            )
+        )
+    for invoice, result in zip(invoices, await asyncio.gather(*deliveries, return_exceptions=True)):
+        if isinstance(result, Exception):
+            print(f"[run_pipeline_batch] delivery failed for {invoice['vendor']!r}: {result}")
+
+    return summary
+
+
+async def _deliver(
+    vendor: str,
+    callback_url: str,
+    files: list[dict],
+    routing: dict,
+    sections: list[dict],
+    markdown: str,
+    status: str,
+    error: str | None,
+):
+    """Email one invoice's results and POST them to callback_url if one was given."""
+    from app.email_sender import send_results
+    from app.http_client import get_client
+
+    # Step 4: Email results
     traveller_name = _extract_traveller_name(sections, markdown=markdown)
 
     await send_results(
@@ -495,7 +810,7 @@ async def run_pipeline(
         sections=sections,
         status=status,
         error=error,
-        attachments=files_b64,
+        attachments=files,
     )
 
     # Step 5: Also POST to callback_url if one was provided (n8n / API compat)
@@ -507,8 +822,13 @@ async def run_pipeline(
         }
         if error:
             payload["error"] = error
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            await client.post(callback_url, json=payload)
+        # Shared pooled client — warm containers skip the TLS handshake.
+        await get_client().post(
+            callback_url,
+            headers={"Content-Type": "application/json"},
+            content=orjson.dumps(payload),
+            timeout=30.0,
+        )
 
 
 # ── Modal ASGI entrypoint ──────────────────────────────────────────────────────